@@ -0,0 +1,243 @@
+import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import os
+import tempfile
+import logging
+
+logger = logging.getLogger("MusicBridge")
+
+class _HashingWriter:
+    """Text sink that hashes everything written before passing it on."""
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha = hashlib.sha256()
+
+    def write(self, text):
+        self.sha.update(text.encode('utf-8'))
+        self.stream.write(text)
+
+def iter_playlists(db):
+    """Yields one playlist dict at a time from a single ordered query."""
+    rows = db.iter_playlist_contents()
+    for (pid, title, description), group in itertools.groupby(rows, key=lambda r: r[:3]):
+        yield {
+            'id': pid,
+            'title': title,
+            'description': description,
+            'tracks': [r[3] for r in group if r[3] is not None]
+        }
+
+def _write_json(db, out):
+    """Same layout as json.dump(indent=2), written playlist by playlist."""
+    out.write('{\n  "playlists": [')
+    first = True
+    for playlist in iter_playlists(db):
+        body = json.dumps(playlist, indent=2, ensure_ascii=False).replace('\n', '\n    ')
+        out.write(('\n    ' if first else ',\n    ') + body)
+        first = False
+    out.write('\n  ]\n}' if not first else ']\n}')
+
+def _write_ndjson(db, out):
+    """One compact playlist object per line."""
+    for playlist in iter_playlists(db):
+        out.write(json.dumps(playlist, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+def _write_csv(db, out):
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(['video_id', 'title', 'artist', 'album', 'duration', 'is_explicit'])
+    for row in db.iter_tracks():
+        writer.writerow(row)
+
+def _write_atomic(db, path, write_fn, compress=None):
+    """
+    Streams write_fn's output into a temp file next to `path`, then renames it over
+    the target. Skips the rename when the content hash matches the last export.
+    Returns {'path', 'written', 'sha256'}.
+    """
+    if compress is None:
+        compress = path.endswith('.gz')
+    directory = os.path.dirname(os.path.abspath(path))
+    hash_key = f"export_sha256:{os.path.abspath(path)}"
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            # mtime=0 keeps gzip output byte-identical for identical content
+            binary = gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) if compress else raw
+            text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+            sink = _HashingWriter(text)
+            write_fn(db, sink)
+            text.flush()
+            text.detach() # Don't let the wrapper close the underlying file
+            if compress:
+                binary.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        digest = sink.sha.hexdigest()
+        if os.path.exists(path) and db.get_meta(hash_key) == digest:
+            os.remove(tmp_path)
+            logger.debug(f"{path} unchanged, skipped write.")
+            return {'path': path, 'written': False, 'sha256': digest}
+
+        os.chmod(tmp_path, 0o644) # mkstemp creates 0600
+        os.replace(tmp_path, path)
+        db.set_meta(hash_key, digest)
+        return {'path': path, 'written': True, 'sha256': digest}
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class _StreamingArrayReader:
+    """
+    Incremental reader over a JSON text stream: json.JSONDecoder.raw_decode on a
+    buffer that is refilled whenever a value runs past its end, so only the value
+    being decoded (one playlist) is held in memory.
+    """
+    CHUNK = 1 << 16
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Appends at least a chunk (more for large values, to keep re-parsing linear). False at EOF."""
+        if self.eof:
+            return False
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        chunk = self.stream.read(max(self.CHUNK, len(self.buf)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ('' at end of input)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Invalid backup file: expected {char!r} at offset {self.pos}, got {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof: # A number at the buffer edge may continue
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def array(self):
+        """Yields the items of the array starting at the current position."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+def _read_json(stream):
+    """Playlists from {"playlists": [...]} (other keys are skipped) or a bare array."""
+    reader = _StreamingArrayReader(stream)
+    if reader.peek() == '[':
+        yield from reader.array()
+        return
+    reader.expect('{')
+    while reader.peek() != '}':
+        key = reader.value()
+        reader.expect(':')
+        if key == 'playlists':
+            yield from reader.array()
+        else:
+            reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+    reader.expect('}')
+
+def _read_ndjson(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+def _open_binary(path):
+    """Opens a backup or export for reading; gzip is detected from the magic bytes."""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+def read_tracks_csv(path='library_export.csv'):
+    """Yields (video_id, title, artist, album, duration, is_explicit) rows of an export_tracks_csv file."""
+    with _open_binary(path) as binary:
+        with io.TextIOWrapper(binary, encoding='utf-8-sig', newline='') as text:
+            for row in csv.DictReader(text):
+                yield (row['video_id'], row['title'], row['artist'], row['album'] or None,
+                       row['duration'] or None, int(row['is_explicit'] in ('1', 'True', 'true')))
+
+def import_library(db, csv_path='library_export.csv', backup_path='library_backup.json'):
+    """
+    Rebuilds the database from a track export and/or a playlist backup (the files
+    scan_library writes) without contacting YouTube; see DBManager.bulk_import.
+    Either path may be None. Returns bulk_import's counts.
+    """
+    tracks = read_tracks_csv(csv_path) if csv_path else ()
+    playlists = read_backup(backup_path) if backup_path else ()
+    return db.bulk_import(tracks, playlists)
+
+def read_backup(path='library_backup.json'):
+    """
+    Yields the playlists ({'id', 'title', 'description', 'tracks'}) of a backup written
+    by export_library, one at a time. JSON vs NDJSON and gzip are detected from the content.
+    """
+    with _open_binary(path) as binary:
+        # NDJSON starts with a playlist object on one line; the JSON layout with '[' or '{' + newline/"playlists"
+        head = binary.read(64).decode('utf-8-sig', errors='ignore').lstrip()
+        ndjson = head.startswith('{') and not head[1:].lstrip(' \t').startswith(('\n', '\r', '"playlists"', '}'))
+        binary.seek(0)
+        with io.TextIOWrapper(binary, encoding='utf-8-sig') as text:
+            for playlist in (_read_ndjson(text) if ndjson else _read_json(text)):
+                yield {
+                    'id': playlist.get('id'),
+                    'title': playlist.get('title') or '',
+                    'description': playlist.get('description') or '',
+                    'tracks': [v for v in playlist.get('tracks') or [] if v],
+                }
+
+def export_library(db, path='library_backup.json', fmt='json', compress=None):
+    """
+    Writes the playlist backup (ids, titles, ordered video_ids).
+    fmt: 'json' (indented, the historical format) or 'ndjson' (one playlist per line).
+    compress: gzip the output; defaults to True when path ends with '.gz'.
+    """
+    writers = {'json': _write_json, 'ndjson': _write_ndjson}
+    if fmt not in writers:
+        raise ValueError(f"Unknown backup format: {fmt}")
+    return _write_atomic(db, path, writers[fmt], compress)
+
+def export_tracks_csv(db, path='library_export.csv', compress=None):
+    """Writes every track (video_id,title,artist,album,duration,is_explicit) as CSV."""
+    return _write_atomic(db, path, _write_csv, compress)
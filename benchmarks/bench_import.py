@@ -0,0 +1,82 @@
+"""
+Rebuilding the database from library_export.csv + library_backup.json:
+row-by-row DBManager.add_track (one call and FTS trigger per playlist entry,
+one commit per playlist, as a scan used to) vs DBManager.bulk_import (one
+transaction, executemany, FTS rebuilt once at the end).
+
+The corpus can be multiplied to simulate a bigger library:
+
+    python benchmarks/bench_import.py --scale 20
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backup
+from db_manager import DBManager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_corpus(scale):
+    """Returns (track rows, playlists), with ids suffixed per copy."""
+    rows = list(backup.read_tracks_csv(os.path.join(ROOT, 'library_export.csv')))
+    playlists = list(backup.read_backup(os.path.join(ROOT, 'library_backup.json')))
+    tracks, lists = [], []
+    for n in range(scale):
+        tracks += [(f"{r[0]}-{n}",) + r[1:] for r in rows]
+        lists += [dict(p, id=f"{p['id']}-{n}", tracks=[f"{v}-{n}" for v in p['tracks']]) for p in playlists]
+    return tracks, lists
+
+def row_by_row(db, tracks, playlists):
+    by_id = {r[0]: r for r in tracks}
+    for p in playlists:
+        db.add_playlist(p['id'], p['title'], p['description'], len(p['tracks']))
+        for vid in p['tracks']:
+            video_id, title, artist, album, duration, explicit = by_id.get(vid, (vid, '', '', None, None, 0))
+            db.add_track({
+                'videoId': video_id, 'title': title, 'duration': duration, 'isExplicit': bool(explicit),
+                'artists': [{'name': n} for n in artist.split(', ') if n],
+                'album': {'name': album} if album else None,
+            }, p['id'])
+        db.commit()
+
+def bulk(db, tracks, playlists):
+    db.bulk_import(tracks, playlists)
+
+def run(method, tracks, playlists, directory):
+    path = os.path.join(directory, f"{method.__name__}.db")
+    db = DBManager(path)
+    start = time.perf_counter()
+    method(db, tracks, playlists)
+    elapsed = time.perf_counter() - start
+    db.close()
+
+    conn = sqlite3.connect(path)
+    counts = [conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ('tracks', 'artists', 'track_artists', 'playlist_tracks', 'tracks_fts')]
+    conn.close()
+    return elapsed, counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10, help='Copies of the exported library to load')
+    args = parser.parse_args()
+
+    tracks, playlists = load_corpus(args.scale)
+    links = sum(len(p['tracks']) for p in playlists)
+    print(f"{len(tracks)} tracks, {len(playlists)} playlists, {links} playlist entries")
+    print(f"{'Method':<12} {'Time':>8} {'Entries/s':>10}   tracks/artists/track_artists/playlist_tracks/fts")
+    with tempfile.TemporaryDirectory() as directory:
+        results = {}
+        for method in (row_by_row, bulk):
+            elapsed, counts = run(method, tracks, playlists, directory)
+            results[method.__name__] = elapsed
+            print(f"{method.__name__:<12} {elapsed:>7.2f}s {links / elapsed:>10,.0f}   {'/'.join(map(str, counts))}")
+    print(f"\nbulk_import is {results['row_by_row'] / results['bulk']:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
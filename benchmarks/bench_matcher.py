@@ -0,0 +1,109 @@
+"""
+Accuracy and speed of matcher.py on a corpus built from library_export.csv.
+
+Every exported track becomes a query plus a simulated result list: the same
+recording as a streaming service would title it (first " - " part, duration
++-1s) mixed with look-alikes (same artist other song, same title other artist,
+live and remix versions, an unrelated track). Each query is scored twice:
+with the true recording among the candidates (should be picked, above
+MIN_CONFIDENCE) and without it (should be rejected as a miss).
+
+    python benchmarks/bench_matcher.py
+    python benchmarks/bench_matcher.py --backend difflib   # force the fallback
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import matcher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_rows():
+    with open(os.path.join(ROOT, 'library_export.csv'), encoding='utf-8') as f:
+        return [r for r in csv.DictReader(f) if r['title'] and r['artist']]
+
+def as_candidate(title, artist, duration):
+    return {'title': title, 'artists': [a.strip() for a in artist.split(',')], 'duration': duration}
+
+def build_corpus(rows, seed):
+    """Returns [(query, true candidate, distractors)]."""
+    rng = random.Random(seed)
+    by_artist = {}
+    for r in rows:
+        by_artist.setdefault(r['artist'], []).append(r)
+    artists = list(by_artist)
+
+    corpus = []
+    for r in rows:
+        duration = matcher.parse_duration(r['duration'])
+        query = {'title': r['title'], 'artists': [r['artist']], 'duration': duration}
+        store_title = r['title'].split(' - ')[0].strip() or r['title']
+        true = as_candidate(store_title, r['artist'], duration and duration + rng.choice((-1, 0, 1)))
+
+        key = matcher.title_keys(r['title'])[0]
+        same_artist = [o for o in by_artist[r['artist']] if matcher.title_keys(o['title'])[0] != key]
+        other = rng.choice(same_artist) if same_artist else rng.choice(rows)
+        other_artist = rng.choice([a for a in artists if a != r['artist']])
+        unrelated = rng.choice([o for o in rows if o['artist'] != r['artist']])
+        live, remix = [w for w in ('live', 'remix', 'acoustic') if w not in matcher.versions(r['title'])][:2]
+        distractors = [
+            as_candidate(other['title'], other['artist'], matcher.parse_duration(other['duration'])),
+            as_candidate(store_title, other_artist, duration),
+            as_candidate(f"{store_title} - {live.title()}", r['artist'], duration and duration + 12),
+            as_candidate(f"{store_title} ({remix.title()})", r['artist'], duration and duration + 35),
+            as_candidate(unrelated['title'], unrelated['artist'], matcher.parse_duration(unrelated['duration'])),
+        ]
+        corpus.append((query, true, distractors))
+    return corpus
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['auto', 'difflib'], default='auto', help='String similarity implementation')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    if args.backend == 'difflib':
+        matcher._fuzz = None
+        matcher.BACKEND = 'difflib'
+
+    corpus = build_corpus(load_rows(), args.seed)
+    rng = random.Random(args.seed)
+    picked = confident = rejected = false_accepts = 0
+    wrong = []
+    scored = 0
+    start = time.perf_counter()
+    for query, true, distractors in corpus:
+        candidates = distractors + [true]
+        rng.shuffle(candidates)
+        best, confidence = matcher.best_match(query, candidates)
+        if best is true and confidence >= matcher.MIN_CONFIDENCE:
+            picked += 1
+            confident += confidence >= matcher.ACCEPT_CONFIDENCE
+        elif len(wrong) < 10:
+            wrong.append((query['title'], query['artists'][0], best and best['title'], round(confidence, 2)))
+
+        best, confidence = matcher.best_match(query, distractors)
+        if confidence < matcher.MIN_CONFIDENCE:
+            rejected += 1
+        else:
+            false_accepts += 1
+        scored += len(candidates) + len(distractors)
+    elapsed = time.perf_counter() - start
+
+    n = len(corpus)
+    print(f"Backend: {matcher.BACKEND}, {n} queries, {scored} candidates scored")
+    print(f"True recording present: picked {picked}/{n} ({picked / n:.1%}), "
+          f"{confident} above ACCEPT_CONFIDENCE (no second search)")
+    print(f"True recording absent:  rejected {rejected}/{n} ({rejected / n:.1%}), {false_accepts} false accepts")
+    print(f"Speed: {scored / elapsed:,.0f} candidates/s ({elapsed * 1000 / n:.2f} ms per query)")
+    if wrong:
+        print("\nSample misses (query title, artist, picked title, confidence):")
+        for row in wrong:
+            print(f"    {row}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Query plans and timings for the hot DBManager lookups, before and after the
+schema migrations (secondary indexes).
+
+Builds a throwaway database from library_export.csv + library_backup.json,
+optionally multiplied to simulate a bigger library:
+
+    python benchmarks/query_plans.py --scale 20
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db_manager import DBManager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUERIES = {
+    'get_artist_playlists': ('''
+        SELECT DISTINCT p.title
+        FROM playlists p
+        JOIN playlist_tracks pt ON p.id = pt.playlist_id
+        JOIN tracks t ON pt.video_id = t.video_id
+        WHERE t.artist = ?
+    ''', ('Eve',)),
+    'get_global_duplicates (playlists per track)': ('''
+        SELECT DISTINCT p.id, p.title
+        FROM playlists p
+        JOIN playlist_tracks pt ON p.id = pt.playlist_id
+        WHERE pt.video_id = ?
+    ''', ('dEfl-ObuapA',)),
+    'cleanup_orphans (tracks)': ('''
+        SELECT COUNT(*) FROM tracks
+        WHERE video_id NOT IN (SELECT DISTINCT video_id FROM playlist_tracks)
+    ''', ()),
+    'cleanup_orphans (artists)': ('''
+        SELECT COUNT(*) FROM artists
+        WHERE id NOT IN (SELECT DISTINCT artist_id FROM track_artists)
+    ''', ()),
+    'deduplicate_playlist (delete by set_video_id)': ('''
+        SELECT COUNT(*) FROM playlist_tracks WHERE set_video_id = ?
+    ''', ('set-0-dEfl-ObuapA',)),
+}
+
+def load_library(db_path, scale):
+    """Fills the database with `scale` copies of the exported library."""
+    with open(os.path.join(ROOT, 'library_export.csv'), encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    with open(os.path.join(ROOT, 'library_backup.json'), encoding='utf-8') as f:
+        playlists = json.load(f)['playlists']
+
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    for n in range(scale):
+        suffix = f"-{n}" if n else ""
+        cur.executemany(
+            'INSERT OR IGNORE INTO tracks (video_id, title, artist, album, duration, is_explicit) VALUES (?, ?, ?, ?, ?, ?)',
+            [(r['video_id'] + suffix, r['title'], r['artist'] + suffix, r['album'], r['duration'], r['is_explicit']) for r in rows]
+        )
+        cur.executemany('INSERT OR IGNORE INTO artists (name) VALUES (?)', [(r['artist'] + suffix,) for r in rows])
+        cur.execute('''
+            INSERT OR IGNORE INTO track_artists (track_id, artist_id)
+            SELECT t.video_id, a.id FROM tracks t JOIN artists a ON a.name = t.artist
+        ''')
+        for p in playlists:
+            pid = p['id'] + suffix
+            cur.execute('INSERT OR REPLACE INTO playlists (id, title, description, track_count) VALUES (?, ?, ?, ?)',
+                        (pid, p['title'] + suffix, p.get('description', ''), len(p['tracks'])))
+            cur.executemany(
+                'INSERT OR IGNORE INTO playlist_tracks (playlist_id, video_id, set_video_id, added_by) VALUES (?, ?, ?, ?)',
+                [(pid, vid + suffix, f"set-{n}-{vid}", "User") for vid in p['tracks']]
+            )
+    conn.commit()
+    conn.close()
+
+def report(db, label, repeat):
+    print(f"\n=== {label} (schema version {db.get_schema_version()}) ===")
+    cur = db._read_cursor()
+    for name, (sql, params) in QUERIES.items():
+        cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+        plan = [row[3] for row in cur.fetchall()]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cur.execute(sql, params)
+            cur.fetchall()
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        print(f"\n{name}: {elapsed:.3f} ms")
+        for step in plan:
+            print(f"    {step}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10, help='Copies of the library to load')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per query')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        DBManager(db_path, schema_version=0).close()
+        load_library(db_path, args.scale)
+
+        db = DBManager(db_path, schema_version=0)
+        report(db, "Before migrations", args.repeat)
+        db.close()
+
+        db = DBManager(db_path) # Applies pending migrations to the existing database
+        report(db, "After migrations", args.repeat)
+        db.close()
+
+if __name__ == "__main__":
+    main()
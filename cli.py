@@ -18,7 +18,8 @@ def handle_scan(args):
     try:
         # Determine strict or normal scan
         # We pass None as progress_callback to keep it silent
-        result = scan_library(progress_callback=None, force_update=args.force)
+        result = scan_library(progress_callback=None, force_update=args.force,
+                              backup_path=args.backup_path, backup_format=args.backup_format)
         
         if result.get('error') == 'NO_PLAYLISTS_FOUND':
             print("\n❌ Error: No playlists found.")
@@ -38,6 +39,12 @@ def handle_scan(args):
         for p in found:
             print(f" - {p}")
 
+        scan_reasons = result.get('scan_reasons', {})
+        if scan_reasons:
+            print(f"\nRescanned ({len(scan_reasons)}, {result.get('skipped', 0)} unchanged):")
+            for entry in scan_reasons.values():
+                print(f" - {entry['title']}: {entry['reason']}")
+
         print(f"\nNew Songs ({total_new}):")
         if total_new > 0 and result.get('added_songs'):
             for pl_name, songs in result['added_songs'].items():
@@ -77,33 +84,33 @@ def handle_sort(args):
     # ---------------------------
 
     if args.all:
-        print(f"📂 Sorting ALL {len(valid_playlists)} playlists...")
-        import time 
+        print(f"📂 Sorting ALL {len(valid_playlists)} playlists ({args.workers} at a time)...")
         total = len(valid_playlists)
         bar_length = 20
+        done = []
 
-        for i, p in enumerate(valid_playlists):
-            # Calculate progress
-            percent = (i / total) 
+        def on_done(result):
+            done.append(result)
+            percent = len(done) / total if total else 1
             filled_length = int(bar_length * percent)
             bar = '█' * filled_length + '░' * (bar_length - filled_length)
-            
-            # Print bar with current playlist name
-            sys.stdout.write(f"\rSorting: [{bar}] {int(percent * 100)}% - {p['title'][:30]:<30}")
+            sys.stdout.write(f"\rSorting: [{bar}] {int(percent * 100)}% - {result['title'][:30]:<30}")
             sys.stdout.flush()
 
-            try:
-                # Suppress prints from sorter by capturing stdout if needed, or rely on logic removal
-                # Since we cleaned sorter interaction, it should be quiet.
-                pm.sort_standard(p['playlistId'], title_hint=p['title'], create_copy=not args.in_place)
-                time.sleep(2) 
-            except Exception as e:
-                # Move to new line to show error, then continue progress bar on next line
-                sys.stdout.write(f"\n❌ Failed to sort {p['title']}: {e}\n")
-        
-        # Final 100% bar
+        start = time.monotonic()
+        results = pm.sort_many(valid_playlists, create_copy=not args.in_place, workers=args.workers, on_done=on_done)
         sys.stdout.write(f"\rSorting: [{'█' * bar_length}] 100% - Done!{' '*30}\n")
-        print("✅ Batch Sort Complete.")
+
+        # Per-playlist timing summary
+        print(f"\n{'Playlist':<40} {'Result':<15} {'Time':>7}")
+        for r in results:
+            detail = f" ({r['detail']})" if r['detail'] else ""
+            print(f"{r['title'][:40]:<40} {r['status']:<15} {r['seconds']:>6.1f}s{detail}")
+        counts = {}
+        for r in results:
+            counts[r['status']] = counts.get(r['status'], 0) + 1
+        summary = ", ".join(f"{n} {status}" for status, n in counts.items())
+        print(f"\n✅ Batch Sort Complete in {time.monotonic() - start:.1f}s: {summary}.")
         return
 
     # Interactive selection if no specific arg (or if we add a --name filter later)
@@ -130,9 +137,15 @@ def handle_sort(args):
             new_title = f"{target['title']} [Sorted]"
             # print(f"Sorting '{target['title']}'...") # Optional: User wanted minimal
             
-            pm.sort_standard(target['playlistId'], title_hint=target['title'], create_copy=not args.in_place)
-            
-            print(f"Creating new playlist: {new_title}") # Validated confirmation
+            if args.in_place:
+                try:
+                    moves = pm.sort_in_place(target['playlistId'])
+                    print(f"Sorted in place ({moves} moves)." if moves else "Already sorted.")
+                except RuntimeError as e:
+                    print(f"❌ {e}")
+            else:
+                pm.sort_standard(target['playlistId'], title_hint=target['title'])
+                print(f"Creating new playlist: {new_title}") # Validated confirmation
         else:
             print("Invalid selection.")
     except ValueError:
@@ -155,7 +168,9 @@ def handle_sync(args):
             msg = f"Syncing {p['title']}..."
             print(f"\n[{i+1}/{len(yt_pl)}] {msg}")
             try:
-                engine.sync_to_spotify(p['playlistId'], smart=True, progress_callback=progress_reporter)
+                result = engine.sync_to_spotify(p['playlistId'], sp_playlist_name=p['title'], smart=True,
+                                                progress_callback=progress_reporter, mirror=args.mirror)
+                print(f"\n{result}")
             except Exception as e:
                 print(f"\n❌ Failed: {e}")
         print("\n\n✅ Batch Sync Complete.")
@@ -177,13 +192,39 @@ def handle_sync(args):
         if 0 <= idx < len(yt_pl):
             target = yt_pl[idx]
             print(f"\nSyncing '{target['title']}' to Spotify...")
-            engine.sync_to_spotify(target['playlistId'], smart=True, progress_callback=progress_reporter)
-            print("\n\n✅ Sync Finished.")
+            result = engine.sync_to_spotify(target['playlistId'], sp_playlist_name=target['title'], smart=True,
+                                            progress_callback=progress_reporter, mirror=args.mirror)
+            print(f"\n{result}")
+            print("\n✅ Sync Finished.")
         else:
             print("Invalid selection.")
     except ValueError:
         print("Invalid input.")
 
+def handle_import(args):
+    import backup
+    from db_manager import DBManager
+
+    csv_path = args.csv if args.csv and os.path.exists(args.csv) else None
+    backup_path = args.backup if args.backup and os.path.exists(args.backup) else None
+    for label, path, found in (('Track export', args.csv, csv_path), ('Playlist backup', args.backup, backup_path)):
+        if path and not found:
+            print(f"⚠️  {label} not found: {path} (skipped)")
+    if not csv_path and not backup_path:
+        print("❌ Nothing to import.")
+        return
+
+    db = DBManager()
+    try:
+        start = time.monotonic()
+        stats = backup.import_library(db, csv_path, backup_path)
+        print(f"✅ Imported {stats['tracks']} new tracks, {stats['playlists']} playlists "
+              f"({stats['links']} playlist entries) in {time.monotonic() - start:.2f}s.")
+    except Exception as e:
+        print(f"\n❌ Import failed, database unchanged: {e}")
+    finally:
+        db.close()
+
 def main():
     parser = argparse.ArgumentParser(description="MusicBridge CLI Tool 🎵")
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
@@ -191,15 +232,24 @@ def main():
     # SCAN
     parser_scan = subparsers.add_parser('scan', help='Scan library for new tracks')
     parser_scan.add_argument('--force', action='store_true', help='Force full metadata refresh')
+    parser_scan.add_argument('--backup-format', choices=['json', 'ndjson'], default='json', help='Backup file format (ndjson is compact, one playlist per line)')
+    parser_scan.add_argument('--backup-path', default='library_backup.json', help='Backup file path (use a .gz suffix to compress)')
 
     # SORT
     parser_sort = subparsers.add_parser('sort', help='Sort playlists (Artist -> Title)')
     parser_sort.add_argument('--all', action='store_true', help='Sort ALL playlists automatically')
-    parser_sort.add_argument('--in-place', action='store_true', help='Sort in-place (DANGEROUS: overwrites original). Default is to create a copy.')
+    parser_sort.add_argument('--workers', type=int, default=4, help='Playlists sorted concurrently with --all (they share one request budget)')
+    parser_sort.add_argument('--in-place', action='store_true', help='Reorder the playlist itself with the minimum number of moves. Default is to create a copy.')
 
     # SYNC
     parser_sync = subparsers.add_parser('sync', help='Sync YouTube playlists to Spotify')
     parser_sync.add_argument('--all', action='store_true', help='Sync ALL playlists automatically')
+    parser_sync.add_argument('--mirror', action='store_true', help='Make Spotify match YouTube exactly (also removes and reorders tracks)')
+
+    # IMPORT
+    parser_import = subparsers.add_parser('import', help='Rebuild the local database from library_export.csv / library_backup.json')
+    parser_import.add_argument('--csv', default='library_export.csv', help='Track export (video_id,title,artist,album,duration,is_explicit; .gz ok)')
+    parser_import.add_argument('--backup', default='library_backup.json', help='Playlist backup (json or ndjson; .gz ok)')
 
     args = parser.parse_args()
 
@@ -209,6 +259,8 @@ def main():
         handle_sort(args)
     elif args.command == 'sync':
         handle_sync(args)
+    elif args.command == 'import':
+        handle_import(args)
     else:
         parser.print_help()
 
@@ -1,18 +1,251 @@
 import sqlite3
 import os
+import time
+import json
+import queue
+import threading
+import functools
+import contextlib
+import itertools
+from concurrent.futures import Future
+from normalize import normalize_artist
+
+# Applied to every connection. WAL lets readers run while the writer commits.
+PRAGMAS = [
+    "PRAGMA cache_size = -64000",     # ~64 MB page cache
+    "PRAGMA mmap_size = 268435456",   # 256 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+# Triggers keeping tracks_fts in sync with tracks (suspended during bulk loads, see suspend_fts)
+FTS_TRIGGERS = {
+    'tracks_ai': '''
+        CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
+            INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.rowid, new.title, new.artist, new.album);
+        END;
+    ''',
+    'tracks_ad': '''
+        CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
+            INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album) VALUES('delete', old.rowid, old.title, old.artist, old.album);
+        END;
+    ''',
+    'tracks_au': '''
+        CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE OF title, artist, album ON tracks BEGIN
+            INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album) VALUES('delete', old.rowid, old.title, old.artist, old.album);
+            INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.rowid, new.title, new.artist, new.album);
+        END;
+    ''',
+}
+
+# Versioned schema changes for existing databases, applied in order by DBManager.migrate().
+# Each entry is (version, description, steps); a step is an SQL string or a callable(cursor).
+# Never edit a migration that has shipped - append a new one instead.
+MIGRATIONS = [
+    (1, "Secondary indexes for playlist, duplicate and orphan lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_playlist_tracks_video_id ON playlist_tracks(video_id)",
+        "CREATE INDEX IF NOT EXISTS idx_playlist_tracks_set_video_id ON playlist_tracks(set_video_id)",
+        "CREATE INDEX IF NOT EXISTS idx_tracks_artist ON tracks(artist)",
+        "CREATE INDEX IF NOT EXISTS idx_track_artists_artist_id ON track_artists(artist_id)",
+    ]),
+    (2, "Playlist change detection (content fingerprint, listing signature, last scan time)", [
+        "ALTER TABLE playlists ADD COLUMN fingerprint TEXT",
+        "ALTER TABLE playlists ADD COLUMN listing_signature TEXT",
+        "ALTER TABLE playlists ADD COLUMN scanned_at REAL",
+    ]),
+    (3, "Explicit playlist positions (backfilled from insertion order)", [
+        "ALTER TABLE playlist_tracks ADD COLUMN position INTEGER",
+        # Correlated subquery rather than UPDATE ... FROM, which needs SQLite 3.33+
+        '''
+        UPDATE playlist_tracks SET position = (
+            SELECT COUNT(*) FROM playlist_tracks p2
+            WHERE p2.playlist_id = playlist_tracks.playlist_id AND p2.rowid < playlist_tracks.rowid
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_playlist_tracks_position ON playlist_tracks(playlist_id, position)",
+    ]),
+    (4, "Key/value store for app state (backup hashes, etc.)", [
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    ]),
+    (5, "Normalized artist names for artist routing", [
+        "ALTER TABLE artists ADD COLUMN normalized_name TEXT",
+        lambda cur: cur.executemany(
+            "UPDATE artists SET normalized_name = ? WHERE id = ?",
+            [(normalize_artist(name), aid) for aid, name in cur.execute("SELECT id, name FROM artists").fetchall()]
+        ),
+        "CREATE INDEX IF NOT EXISTS idx_artists_normalized_name ON artists(normalized_name)",
+    ]),
+    (6, "Persisted Spotify playlist index (name -> id per account)", [
+        '''
+        CREATE TABLE IF NOT EXISTS spotify_playlists (
+            id TEXT PRIMARY KEY,
+            owner_id TEXT,
+            name TEXT,
+            snapshot_id TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_spotify_playlists_owner_name ON spotify_playlists(owner_id, name)",
+    ]),
+    (7, "Last mirrored state per YouTube -> Spotify playlist pair", [
+        '''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            yt_playlist_id TEXT,
+            sp_playlist_id TEXT,
+            snapshot_id TEXT,
+            uris TEXT,
+            synced_at REAL,
+            PRIMARY KEY (yt_playlist_id, sp_playlist_id)
+        )
+        ''',
+    ]),
+    (8, "Sync state records the YouTube fingerprint and sync mode", [
+        "ALTER TABLE sync_state ADD COLUMN yt_fingerprint TEXT",
+        "ALTER TABLE sync_state ADD COLUMN mode TEXT",
+        "UPDATE sync_state SET mode = 'mirror'", # Only mirror syncs were recorded before
+    ]),
+    (9, "ISRC per track and how each cross-platform match was found", [
+        "ALTER TABLE tracks ADD COLUMN isrc TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_tracks_isrc ON tracks(isrc)",
+        "ALTER TABLE track_matches ADD COLUMN method TEXT", # 'isrc', 'search' (NULL = before this column)
+    ]),
+    (10, "Restore journal (per-playlist checkpoints for resumable restores)", [
+        '''
+        CREATE TABLE IF NOT EXISTS restore_journal (
+            playlist_id TEXT PRIMARY KEY,
+            new_playlist_id TEXT,
+            status TEXT,
+            total INTEGER,
+            done INTEGER DEFAULT 0,
+            skipped TEXT,
+            error TEXT,
+            updated_at REAL
+        )
+        ''',
+    ]),
+    (11, "Search index: diacritic-insensitive tokens and prefix indexes", [
+        "DROP TRIGGER IF EXISTS tracks_ai",
+        "DROP TRIGGER IF EXISTS tracks_ad",
+        "DROP TRIGGER IF EXISTS tracks_au",
+        "DROP TABLE IF EXISTS tracks_fts",
+        '''
+        CREATE VIRTUAL TABLE tracks_fts USING fts5(
+            title,
+            artist,
+            album,
+            content='tracks',
+            content_rowid='rowid',
+            tokenize="unicode61 remove_diacritics 2",
+            prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
+            INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.rowid, new.title, new.artist, new.album);
+        END;
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
+            INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album) VALUES('delete', old.rowid, old.title, old.artist, old.album);
+        END;
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE OF title, artist, album ON tracks BEGIN
+            INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album) VALUES('delete', old.rowid, old.title, old.artist, old.album);
+            INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.rowid, new.title, new.artist, new.album);
+        END;
+        ''',
+        "INSERT INTO tracks_fts(tracks_fts) VALUES('rebuild')",
+    ]),
+]
+
+def _writes(method):
+    """Runs the decorated method on the writer thread, so all mutations are serialized there."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.submit(method, self, *args, **kwargs).result()
+    return wrapper
 
 class DBManager:
-    def __init__(self, db_path='music_library.db'):
+    def __init__(self, db_path='music_library.db', read_only=False, schema_version=None):
+        """
+        read_only=True skips the writer thread and schema setup; use it for
+        lookups from threads that must never block behind a running scan.
+        schema_version limits migrations to that version (None = latest).
+        """
         self.db_path = db_path
-        self.conn = None
+        self.read_only = read_only
+        self.schema_version = schema_version
+        self.conn = None    # Writer connection, only touched by the writer thread
         self.cursor = None
+        self._artist_ids = {} # Artist name -> id (ingestion cache)
+        self._local = threading.local() # Per-thread read-only connections
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._queue = None
+        self._writer = None
         self.connect()
-        self.init_db()
+        if not read_only:
+            self.init_db()
 
     def connect(self):
-        self.conn = sqlite3.connect(self.db_path)
+        if self.read_only:
+            return
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self.cursor = self.conn.cursor()
+        self.cursor.execute("PRAGMA journal_mode = WAL")
+        self.cursor.execute("PRAGMA synchronous = NORMAL") # Safe in WAL mode, far fewer fsyncs
+        for pragma in PRAGMAS:
+            self.cursor.execute(pragma)
+            
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="DBWriter", daemon=True)
+        self._writer.start()
+
+    def _writer_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            fn, args, kwargs, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues fn(*args, **kwargs) on the writer thread and returns a Future.
+        Calls made from the writer thread itself run immediately.
+        """
+        if self.read_only:
+            raise sqlite3.OperationalError("DBManager was opened read-only")
+        future = Future()
+        if threading.current_thread() is self._writer:
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def _read_cursor(self):
+        """Returns a cursor on this thread's read-only connection (opened on first use)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn.cursor()
 
+    @_writes
     def init_db(self):
         # Tracks table
         self.cursor.execute('''
@@ -89,39 +322,99 @@ class DBManager:
         ''')
 
         # Triggers to keep FTS in sync
+        for trigger_sql in FTS_TRIGGERS.values():
+            self.cursor.execute(trigger_sql)
+
+        # Cross-platform match cache (YouTube video_id <-> Spotify URI)
+        # target_id NULL = searched but not found (negative entry, expires after a TTL)
         self.cursor.execute('''
-            CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
-                INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.rowid, new.title, new.artist, new.album);
-            END;
-        ''')
-        self.cursor.execute('''
-            CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
-                INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album) VALUES('delete', old.rowid, old.title, old.artist, old.album);
-            END;
+            CREATE TABLE IF NOT EXISTS track_matches (
+                source TEXT,     -- 'youtube' or 'spotify'
+                source_id TEXT,  -- video_id or Spotify URI
+                target_id TEXT,  -- matched id on the other platform
+                matched_at REAL,
+                PRIMARY KEY (source, source_id)
+            )
         ''')
+
+        # Applied migrations (see MIGRATIONS)
         self.cursor.execute('''
-            CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE ON tracks BEGIN
-                INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album) VALUES('delete', old.rowid, old.title, old.artist, old.album);
-                INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.rowid, new.title, new.artist, new.album);
-            END;
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at REAL
+            )
         ''')
         
         self.conn.commit()
+        self.migrate(self.schema_version)
+        if self._fts_stale():
+            self.resume_fts() # A bulk load died with the index suspended
+
+    @_writes
+    def migrate(self, target_version=None):
+        """
+        Applies pending MIGRATIONS up to target_version (None = latest).
+        Each migration runs in its own transaction, so a failure leaves the
+        database at the last good version.
+        Returns the resulting schema version.
+        """
+        current = self.get_schema_version()
+        for version, description, steps in MIGRATIONS:
+            if version <= current or (target_version is not None and version > target_version):
+                continue
+            try:
+                self.cursor.execute("BEGIN")
+                for step in steps:
+                    if callable(step):
+                        step(self.cursor)
+                    else:
+                        self.cursor.execute(step)
+                self.cursor.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                    (version, description, time.time())
+                )
+                self.conn.commit()
+                current = version
+            except sqlite3.Error:
+                self._rollback()
+                raise
+        return current
+
+    @_writes
+    def get_schema_version(self):
+        self.cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return self.cursor.fetchone()[0]
 
+    @_writes
     def add_playlist(self, pid, title, description, count):
+        # Upsert (not REPLACE) so the scan state columns survive metadata updates
         self.cursor.execute('''
-            INSERT OR REPLACE INTO playlists (id, title, description, track_count)
+            INSERT INTO playlists (id, title, description, track_count)
             VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                title = excluded.title,
+                description = excluded.description,
+                track_count = excluded.track_count
         ''', (pid, title, description, count))
         # Commit is now handled manually for batch performance
 
-    def add_track(self, track_data, playlist_id):
+    @_writes
+    def set_playlist_scan_state(self, pid, fingerprint, listing_signature):
+        """Records a successful scan: content fingerprint, listing signature and scan time."""
+        self.cursor.execute('''
+            UPDATE playlists SET fingerprint = ?, listing_signature = ?, scanned_at = ?
+            WHERE id = ?
+        ''', (fingerprint, listing_signature, time.time(), pid))
+
+    def _parse_track(self, track_data):
         """
-        track_data: dict from ytmusicapi
+        Normalizes a ytmusicapi track dict into the columns we store.
+        Returns None for tracks without a videoId.
         """
         video_id = track_data.get('videoId')
         if not video_id:
-            return # Skip tracks without ID (uploads/local files might be tricky)
+            return None # Skip tracks without ID (uploads/local files might be tricky)
 
         title = track_data.get('title', '')
         artists_list = track_data.get('artists', [])
@@ -132,131 +425,715 @@ class DBManager:
         else:
             artist_name = str(artists_list) if artists_list else "Unknown"
             # If artists is not a list, try to make it one for normalization
-            if artists_list:
-                artists_list = [{'name': str(artists_list)}]
+            artists_list = [{'name': str(artists_list)}] if artists_list else []
             
         album = track_data.get('album', {}).get('name') if track_data.get('album') else None
-        duration = track_data.get('duration')
-        is_explicit = track_data.get('isExplicit', False)
-        set_video_id = track_data.get('setVideoId')
-
-        # Insert Track (Ignore if exists, maybe update?)
-        self.cursor.execute('''
-            INSERT OR IGNORE INTO tracks (video_id, title, artist, album, duration, is_explicit)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (video_id, title, artist_name, album, duration, is_explicit))
         
-        is_new = self.cursor.rowcount > 0
+        return {
+            'video_id': video_id,
+            'title': title,
+            'artist': artist_name,
+            'album': album,
+            'duration': track_data.get('duration'),
+            'is_explicit': track_data.get('isExplicit', False),
+            'set_video_id': track_data.get('setVideoId'),
+            'isrc': track_data.get('isrc'), # Only when the source exposes it
+            'artist_names': [a.get('name') for a in artists_list if a.get('name')],
+        }
 
-        # Link to Playlist
-        self.cursor.execute('''
-            INSERT OR REPLACE INTO playlist_tracks (playlist_id, video_id, set_video_id, added_by)
-            VALUES (?, ?, ?, ?)
-        ''', (playlist_id, video_id, set_video_id, "User"))
+    def _get_artist_ids(self, names):
+        """
+        Returns {name: artist_id}, creating missing artists.
+        Ids are memoized per connection so repeated artists cost no queries.
+        """
+        missing = [n for n in set(names) if n not in self._artist_ids]
+        if missing:
+            self.cursor.executemany(
+                'INSERT OR IGNORE INTO artists (name, normalized_name) VALUES (?, ?)',
+                [(n, normalize_artist(n)) for n in missing]
+            )
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i+500]
+                placeholders = ",".join("?" * len(chunk))
+                self.cursor.execute(f'SELECT name, id FROM artists WHERE name IN ({placeholders})', chunk)
+                self._artist_ids.update(self.cursor.fetchall())
+        return {n: self._artist_ids[n] for n in names}
+
+    def _rollback(self, savepoint=None):
+        """
+        Undoes the open transaction (or everything since `savepoint`) and forgets the
+        cached artist ids, which may belong to artists the rollback just removed.
+        """
+        if savepoint:
+            self.cursor.execute(f"ROLLBACK TO {savepoint}")
+            self.cursor.execute(f"RELEASE {savepoint}")
+        else:
+            self.conn.rollback()
+        self._artist_ids.clear()
+
+    @contextlib.contextmanager
+    def _savepoint(self, name):
+        """Runs the block inside the pending (manual-commit) transaction; on error only its writes are undone."""
+        if not self.conn.in_transaction:
+            self.cursor.execute("BEGIN")
+        self.cursor.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            self._rollback(name)
+            raise
+        self.cursor.execute(f"RELEASE {name}")
+
+    def _next_position(self, playlist_id):
+        self.cursor.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM playlist_tracks WHERE playlist_id = ?', (playlist_id,))
+        return self.cursor.fetchone()[0]
+
+    @_writes
+    def add_track(self, track_data, playlist_id):
+        """
+        track_data: dict from ytmusicapi
+        """
+        t = self._parse_track(track_data)
+        if not t:
+            return
+
+        with self._savepoint('add_track'):
+            # Insert Track (Ignore if exists, maybe update?)
+            self.cursor.execute('''
+                INSERT OR IGNORE INTO tracks (video_id, title, artist, album, duration, is_explicit, isrc)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (t['video_id'], t['title'], t['artist'], t['album'], t['duration'], t['is_explicit'], t['isrc']))
         
-        # --- Artist Normalization ---
-        for artist in artists_list:
-            name = artist.get('name')
-            if not name: continue
-            
-            # Insert Artist
-            self.cursor.execute('INSERT OR IGNORE INTO artists (name) VALUES (?)', (name,))
-            
-            # Get Artist ID
-            self.cursor.execute('SELECT id FROM artists WHERE name = ?', (name,))
-            artist_id = self.cursor.fetchone()[0]
-            
-            # Link Track to Artist
+            is_new = self.cursor.rowcount > 0
+            if not is_new and t['isrc']:
+                self.cursor.execute('UPDATE tracks SET isrc = ? WHERE video_id = ? AND isrc IS NULL', (t['isrc'], t['video_id']))
+
+            # Link to Playlist (appended at the end)
             self.cursor.execute('''
+                INSERT OR REPLACE INTO playlist_tracks (playlist_id, video_id, set_video_id, added_by, position)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (playlist_id, t['video_id'], t['set_video_id'], "User", self._next_position(playlist_id)))
+        
+            # --- Artist Normalization ---
+            artist_ids = self._get_artist_ids(t['artist_names'])
+            self.cursor.executemany('''
                 INSERT OR IGNORE INTO track_artists (track_id, artist_id)
                 VALUES (?, ?)
-            ''', (video_id, artist_id))
-        # ----------------------------
-        
+            ''', [(t['video_id'], aid) for aid in artist_ids.values()])
+            # ----------------------------
+
         return is_new
-        
+
+    def _insert_tracks(self, parsed):
+        """
+        Inserts tracks, artists and track_artists for [(track_dict, parsed_row), ...].
+        Returns the track dicts that were new to the library.
+        """
+        # Which tracks are new? (INSERT OR IGNORE + executemany can't tell us per row)
+        existing = set()
+        ids = list({t['video_id'] for _, t in parsed})
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i+500]
+            placeholders = ",".join("?" * len(chunk))
+            self.cursor.execute(f'SELECT video_id FROM tracks WHERE video_id IN ({placeholders})', chunk)
+            existing.update(r[0] for r in self.cursor.fetchall())
+
+        new_tracks = []
+        for td, t in parsed:
+            if t['video_id'] not in existing:
+                existing.add(t['video_id'])
+                new_tracks.append(td)
+
+        self.cursor.executemany('''
+            INSERT OR IGNORE INTO tracks (video_id, title, artist, album, duration, is_explicit, isrc)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(t['video_id'], t['title'], t['artist'], t['album'], t['duration'], t['is_explicit'], t['isrc']) for _, t in parsed])
+        # Identifiers can show up after a track was first stored
+        self.cursor.executemany(
+            'UPDATE tracks SET isrc = ? WHERE video_id = ? AND isrc IS NULL',
+            [(t['isrc'], t['video_id']) for _, t in parsed if t['isrc']]
+        )
+
+        artist_ids = self._get_artist_ids([n for _, t in parsed for n in t['artist_names']])
+        self.cursor.executemany('''
+            INSERT OR IGNORE INTO track_artists (track_id, artist_id)
+            VALUES (?, ?)
+        ''', [(t['video_id'], artist_ids[n]) for _, t in parsed for n in t['artist_names']])
+
+        return new_tracks
+
+    @_writes
+    def add_tracks(self, playlist_id, tracks):
+        """
+        Bulk version of add_track for a whole playlist (one executemany per table).
+        Tracks are appended after the playlist's current last position.
+        tracks: list of dicts from ytmusicapi
+        Returns the track dicts that were new to the library.
+        """
+        parsed = [(td, self._parse_track(td)) for td in tracks]
+        parsed = [(td, t) for td, t in parsed if t]
+        if not parsed:
+            return []
+
+        with self._savepoint('add_tracks'):
+            new_tracks = self._insert_tracks(parsed)
+            start = self._next_position(playlist_id)
+            self.cursor.executemany('''
+                INSERT OR REPLACE INTO playlist_tracks (playlist_id, video_id, set_video_id, added_by, position)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(playlist_id, t['video_id'], t['set_video_id'], "User", start + n) for n, (_, t) in enumerate(parsed)])
+
+        return new_tracks
+
+    def _fts_stale(self):
+        try:
+            self.cursor.execute("SELECT value FROM meta WHERE key = 'fts_stale'")
+        except sqlite3.OperationalError:
+            return False # Schema pinned below the meta table
+        return self.cursor.fetchone() is not None
+
+    def _drop_fts_triggers(self):
+        for name in FTS_TRIGGERS:
+            self.cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    def _rebuild_fts(self, optimize=False):
+        for trigger_sql in FTS_TRIGGERS.values():
+            self.cursor.execute(trigger_sql)
+        self.cursor.execute("INSERT INTO tracks_fts(tracks_fts) VALUES('rebuild')")
+        if optimize:
+            self.cursor.execute("INSERT INTO tracks_fts(tracks_fts) VALUES('optimize')")
+
+    @_writes
+    def suspend_fts(self):
+        """
+        Bulk mode: drops the FTS triggers so track writes skip per-row index updates.
+        Call resume_fts() when done; if the process dies first,
+        the next DBManager rebuilds the index on open.
+        """
+        self.conn.commit()
+        self._drop_fts_triggers()
+        self.cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_stale', '1')")
+        self.conn.commit()
+
+    @_writes
+    def resume_fts(self, optimize=True):
+        """Ends bulk mode: restores the triggers, rebuilds the index and merges its segments."""
+        self.conn.commit()
+        self._rebuild_fts(optimize)
+        self.cursor.execute("DELETE FROM meta WHERE key = 'fts_stale'")
+        self.conn.commit()
+
+    @_writes
+    def bulk_import(self, tracks=(), playlists=(), chunk_size=5000):
+        """
+        Loads a library export in a single transaction, without per-row FTS maintenance
+        (triggers suspended, index rebuilt once at the end, see suspend_fts).
+        tracks: (video_id, title, artist, album, duration, is_explicit) rows, artist being the
+                ", "-joined credit (as in library_export.csv); tracks already stored are kept.
+        playlists: {'id', 'title', 'description', 'tracks': [video_id, ...]} dicts (as in the
+                   backup); their stored contents and scan state are replaced, so the next
+                   scan rescans them and fills in the setVideoIds imports don't carry.
+        Both may be generators; they are consumed in chunks.
+        Returns {'tracks': new tracks, 'playlists': n, 'links': n}.
+        """
+        stats = {'tracks': 0, 'playlists': 0, 'links': 0}
+        self.conn.commit() # Flush pending manual-commit writes so BEGIN starts a fresh transaction
+        try:
+            self.cursor.execute("BEGIN")
+            self._drop_fts_triggers()
+            self.cursor.execute("SELECT COUNT(*) FROM tracks")
+            before = self.cursor.fetchone()[0]
+
+            rows = iter(tracks)
+            while True:
+                chunk = [r for r in itertools.islice(rows, chunk_size) if r and r[0]]
+                if not chunk:
+                    break
+                self.cursor.executemany('''
+                    INSERT OR IGNORE INTO tracks (video_id, title, artist, album, duration, is_explicit)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', chunk)
+                credits = [(r[0], [n.strip() for n in (r[2] or '').split(', ') if n.strip()]) for r in chunk]
+                artist_ids = self._get_artist_ids([n for _, names in credits for n in names])
+                self.cursor.executemany(
+                    'INSERT OR IGNORE INTO track_artists (track_id, artist_id) VALUES (?, ?)',
+                    [(vid, artist_ids[n]) for vid, names in credits for n in names]
+                )
+
+            for playlist in playlists:
+                video_ids = playlist['tracks']
+                self.cursor.execute('''
+                    INSERT INTO playlists (id, title, description, track_count) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        title = excluded.title,
+                        description = excluded.description,
+                        track_count = excluded.track_count,
+                        fingerprint = NULL,
+                        listing_signature = NULL,
+                        scanned_at = NULL
+                ''', (playlist['id'], playlist['title'], playlist['description'], len(video_ids)))
+                self.cursor.execute('DELETE FROM playlist_tracks WHERE playlist_id = ?', (playlist['id'],))
+                self.cursor.executemany('''
+                    INSERT OR IGNORE INTO playlist_tracks (playlist_id, video_id, set_video_id, added_by, position)
+                    VALUES (?, ?, NULL, 'User', ?)
+                ''', [(playlist['id'], vid, pos) for pos, vid in enumerate(video_ids)])
+                stats['playlists'] += 1
+                stats['links'] += self.cursor.rowcount
+
+            self._rebuild_fts()
+            self.cursor.execute("SELECT COUNT(*) FROM tracks")
+            stats['tracks'] = self.cursor.fetchone()[0] - before
+            self.conn.commit()
+        except BaseException:
+            self._rollback()
+            raise
+        return stats
+
+    @_writes
+    def sync_playlist_tracks(self, playlist_id, tracks, scan_state=None):
+        """
+        Reconciles the stored playlist with its remote contents in one transaction:
+        inserts new links, deletes links for songs removed remotely and updates
+        the position/setVideoId of rows that moved. Unchanged rows are not touched.
+        tracks: remote track dicts in playlist order
+        scan_state: optional (fingerprint, listing_signature), recorded in the same
+                    transaction so a failed sync never marks the playlist as scanned
+        Returns {'new_tracks': [...], 'inserted': n, 'removed': n, 'moved': n}
+        """
+        # Remote state: first occurrence wins (one link per video per playlist)
+        remote = {}
+        for td in tracks:
+            t = self._parse_track(td)
+            if t and t['video_id'] not in remote:
+                remote[t['video_id']] = (td, t, len(remote))
+
+        self.cursor.execute(
+            'SELECT rowid, video_id, set_video_id, position FROM playlist_tracks WHERE playlist_id = ?',
+            (playlist_id,)
+        )
+        stored = {}
+        stale_rowids = []
+        for rowid, video_id, set_video_id, position in self.cursor.fetchall():
+            if video_id in stored or video_id not in remote:
+                stale_rowids.append(rowid) # Removed remotely (or a legacy duplicate row)
+            else:
+                stored[video_id] = (rowid, set_video_id, position)
+
+        inserts = [(td, t, pos) for vid, (td, t, pos) in remote.items() if vid not in stored]
+        updates = [
+            (t['set_video_id'], pos, stored[vid][0])
+            for vid, (td, t, pos) in remote.items()
+            if vid in stored and (stored[vid][1], stored[vid][2]) != (t['set_video_id'], pos)
+        ]
+
+        try:
+            self.cursor.executemany('DELETE FROM playlist_tracks WHERE rowid = ?', [(r,) for r in stale_rowids])
+            self.cursor.executemany(
+                'UPDATE playlist_tracks SET set_video_id = ?, position = ? WHERE rowid = ?', updates
+            )
+            new_tracks = self._insert_tracks([(td, t) for td, t, _ in inserts]) if inserts else []
+            self.cursor.executemany('''
+                INSERT INTO playlist_tracks (playlist_id, video_id, set_video_id, added_by, position)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(playlist_id, t['video_id'], t['set_video_id'], "User", pos) for _, t, pos in inserts])
+            if scan_state:
+                self.set_playlist_scan_state(playlist_id, *scan_state)
+            self.conn.commit()
+        except sqlite3.Error:
+            self._rollback()
+            raise
+
+        return {
+            'new_tracks': new_tracks,
+            'inserted': len(inserts),
+            'removed': len(stale_rowids),
+            'moved': len(updates),
+        }
+
+    @_writes
     def commit(self):
         """Explicitly commit changes to the database."""
         if self.conn:
             self.conn.commit()
 
+    def get_playlist_scan_state(self):
+        """Returns {playlist_id: {'track_count', 'fingerprint', 'listing_signature', 'scanned_at'}}."""
+        cur = self._read_cursor()
+        cur.execute("SELECT id, track_count, fingerprint, listing_signature, scanned_at FROM playlists")
+        return {
+            r[0]: {'track_count': r[1], 'fingerprint': r[2], 'listing_signature': r[3], 'scanned_at': r[4]}
+            for r in cur.fetchall()
+        }
+
+    def get_meta(self, key, default=None):
+        cur = self._read_cursor()
+        cur.execute("SELECT value FROM meta WHERE key = ?", (key,))
+        row = cur.fetchone()
+        return row[0] if row else default
+
+    @_writes
+    def set_meta(self, key, value):
+        self.cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        self.conn.commit()
+
+    def iter_playlist_contents(self):
+        """
+        Streams (playlist_id, title, description, video_id) rows for every playlist,
+        grouped by playlist and in playlist order. video_id is None for empty playlists.
+        """
+        cur = self._read_cursor()
+        cur.execute('''
+            SELECT p.id, p.title, p.description, pt.video_id
+            FROM playlists p
+            LEFT JOIN playlist_tracks pt ON pt.playlist_id = p.id
+            ORDER BY p.rowid, pt.position, pt.rowid
+        ''')
+        yield from cur
+
+    def iter_tracks(self):
+        """Streams (video_id, title, artist, album, duration, is_explicit) ordered by artist, title."""
+        cur = self._read_cursor()
+        cur.execute('''
+            SELECT video_id, title, artist, album, duration, is_explicit
+            FROM tracks
+            ORDER BY artist COLLATE NOCASE, title COLLATE NOCASE, video_id
+        ''')
+        yield from cur
+
+    def count_tracks(self):
+        cur = self._read_cursor()
+        cur.execute("SELECT COUNT(*) FROM tracks")
+        return cur.fetchone()[0]
+
+    @_writes
+    def remove_playlists(self, playlist_ids):
+        """Deletes playlists (and their track links) that no longer exist remotely."""
+        for pid in playlist_ids:
+            self.cursor.execute("DELETE FROM playlists WHERE id = ?", (pid,))
+            self.cursor.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (pid,))
+        self.conn.commit()
+
+    @_writes
+    def remove_playlist_items(self, set_video_ids):
+        """Deletes playlist links by their setVideoId (e.g. after removing them remotely)."""
+        self.cursor.executemany("DELETE FROM playlist_tracks WHERE set_video_id = ?", [(svid,) for svid in set_video_ids])
+        self.conn.commit()
+
     def get_all_artists(self):
-        self.cursor.execute('SELECT DISTINCT artist FROM tracks ORDER BY artist')
-        return [r[0] for r in self.cursor.fetchall()]
+        cur = self._read_cursor()
+        cur.execute('SELECT DISTINCT artist FROM tracks ORDER BY artist')
+        return [r[0] for r in cur.fetchall()]
 
     def get_artist_playlists(self, artist):
         """Returns which playlists an artist appears in."""
-        self.cursor.execute('''
+        cur = self._read_cursor()
+        cur.execute('''
             SELECT DISTINCT p.title 
             FROM playlists p
             JOIN playlist_tracks pt ON p.id = pt.playlist_id
             JOIN tracks t ON pt.video_id = t.video_id
             WHERE t.artist = ?
         ''', (artist,))
-        return [r[0] for r in self.cursor.fetchall()]
+        return [r[0] for r in cur.fetchall()]
+
+    def get_artist_routes(self, playlist_ids):
+        """
+        Artist routing index for smart_organize, built in SQL from
+        artists/track_artists/playlist_tracks (kept current by every scan).
+        Returns {normalized_artist_name: playlist_id}, routing each artist to the
+        candidate playlist that holds most of their tracks (ties: earliest in playlist_ids).
+        """
+        playlist_ids = list(playlist_ids)
+        if not playlist_ids:
+            return {}
+        order = {pid: i for i, pid in enumerate(playlist_ids)}
+        placeholders = ",".join("?" * len(playlist_ids))
+        cur = self._read_cursor()
+        cur.execute(f'''
+            SELECT a.normalized_name, pt.playlist_id, COUNT(*)
+            FROM playlist_tracks pt
+            JOIN track_artists ta ON ta.track_id = pt.video_id
+            JOIN artists a ON a.id = ta.artist_id
+            WHERE pt.playlist_id IN ({placeholders}) AND a.normalized_name != ''
+            GROUP BY a.normalized_name, pt.playlist_id
+        ''', playlist_ids)
+        
+        best = {} # name -> (count, -order, playlist_id)
+        for name, pid, count in cur.fetchall():
+            candidate = (count, -order[pid], pid)
+            if name not in best or candidate > best[name]:
+                best[name] = candidate
+        return {name: c[2] for name, c in best.items()}
+
+    def get_scanned_playlist_ids(self):
+        """Ids of playlists whose tracks have been stored by a scan."""
+        cur = self._read_cursor()
+        cur.execute("SELECT id FROM playlists WHERE fingerprint IS NOT NULL")
+        return {r[0] for r in cur.fetchall()}
 
     def get_all_playlists(self):
         """Returns all playlists stored in the DB."""
-        self.cursor.execute('SELECT id, title, description FROM playlists')
-        return [{'id': r[0], 'title': r[1], 'description': r[2]} for r in self.cursor.fetchall()]
+        cur = self._read_cursor()
+        cur.execute('SELECT id, title, description FROM playlists')
+        return [{'id': r[0], 'title': r[1], 'description': r[2]} for r in cur.fetchall()]
 
     def get_playlist_tracks_details(self, playlist_id):
         """
         Returns full track details for a playlist, ordered by position.
-        Format matches what 'sorter.py' expects from Data API.
+        Format matches what 'sorter.py' expects from the Internal API
+        (artists in their original order, setVideoId included).
         """
-        self.cursor.execute('''
-            SELECT t.video_id, t.title, t.artist, t.album, t.duration
+        cur = self._read_cursor()
+        cur.execute('''
+            SELECT t.video_id, t.title, t.artist, t.album, t.duration, pt.set_video_id,
+                   (SELECT json_group_array(name) FROM (
+                        SELECT a.name FROM track_artists ta
+                        JOIN artists a ON a.id = ta.artist_id
+                        WHERE ta.track_id = t.video_id
+                        ORDER BY ta.rowid
+                   ))
             FROM playlist_tracks pt
             JOIN tracks t ON pt.video_id = t.video_id
             WHERE pt.playlist_id = ?
-            ORDER BY pt.rowid
+            ORDER BY pt.position, pt.rowid
         ''', (playlist_id,))
         
         results = []
-        for r in self.cursor.fetchall():
-            # Convert string artist back to list format for sorter compatibility
-            # DB stores "Artist 1, Artist 2", sorter expects [{'name': 'Artist 1'}, ...]
-            # For sorting purposes, the raw string is actually fine if we adjust the sorter key,
-            # but let's try to match the expected format to minimize sorter changes.
-            artist_str = r[2]
-            artists = [{'name': artist_str}] # Simplified
+        for r in cur.fetchall():
+            # Normalized artists when available, else the denormalized "Artist 1, Artist 2" string
+            names = json.loads(r[6]) if r[6] else []
+            artists = [{'name': n} for n in names] or [{'name': r[2]}]
             
             results.append({
                 'videoId': r[0],
                 'title': r[1],
                 'artists': artists,
                 'album': {'name': r[3]},
-                'duration': r[4]
+                'duration': r[4],
+                'setVideoId': r[5] # None until a scan has seen the live entry
             })
         return results
 
     def get_playlist_tracks(self, playlist_id):
-        """Returns all video_ids for a playlist, ordered by insertion (rowid)."""
-        self.cursor.execute('''
+        """Returns all video_ids for a playlist, in playlist order."""
+        cur = self._read_cursor()
+        cur.execute('''
             SELECT video_id 
             FROM playlist_tracks 
             WHERE playlist_id = ? 
-            ORDER BY rowid
+            ORDER BY position, rowid
         ''', (playlist_id,))
-        return [r[0] for r in self.cursor.fetchall()]
-
-    def search_tracks(self, query):
-        """Fast full-text search using FTS5."""
-        # Escape double quotes to prevent syntax errors
-        safe_query = query.replace('"', '""')
-        # FTS5 query syntax: match full phrase or prefix
-        fts_query = f'"{safe_query}"*' 
-        
+        return [r[0] for r in cur.fetchall()]
+
+    @staticmethod
+    def _fts_query(query):
+        """
+        Turns free text into an FTS5 query: every word must match, the last one as a
+        prefix (search-as-you-type). Words are quoted, so FTS syntax in the input is inert.
+        """
+        words = [w.replace('"', '""') for w in query.split()]
+        if not words:
+            return None
+        return ' '.join(f'"{w}"' for w in words) + '*'
+
+    def search_tracks(self, query, limit=50, offset=0):
+        """
+        Ranked full-text search (FTS5 bm25; title matches weigh most, then artist, then album).
+        Accents and case are ignored, so "cancion" finds "Canción".
+        Paginate with limit/offset; count_search_results gives the total.
+        Returns [{'id', 'video_id', 'title', 'artist', 'album', 'snippet'}], 'snippet'
+        being the best matching field with the hits in [brackets].
+        """
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return []
+        cur = self._read_cursor()
+        cur.execute('''
+            SELECT f.rowid, t.video_id, f.title, f.artist, f.album,
+                   snippet(tracks_fts, -1, '[', ']', '…', 10)
+            FROM tracks_fts f
+            JOIN tracks t ON t.rowid = f.rowid
+            WHERE tracks_fts MATCH ?
+            ORDER BY bm25(tracks_fts, 10.0, 5.0, 1.0)
+            LIMIT ? OFFSET ?
+        ''', (fts_query, limit, offset))
+        return [
+            {'id': r[0], 'video_id': r[1], 'title': r[2], 'artist': r[3], 'album': r[4], 'snippet': r[5]}
+            for r in cur.fetchall()
+        ]
+
+    def count_search_results(self, query):
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return 0
+        cur = self._read_cursor()
+        cur.execute('SELECT COUNT(*) FROM tracks_fts WHERE tracks_fts MATCH ?', (fts_query,))
+        return cur.fetchone()[0]
+
+    def get_track_matches(self, source, source_ids, miss_ttl=None):
+        """
+        Looks up cached cross-platform matches.
+        Returns {source_id: target_id} for every cached entry; target_id is None
+        for a cached miss. Misses older than miss_ttl seconds are ignored so they get searched again.
+        """
+        cur = self._read_cursor()
+        matches = {}
+        source_ids = list(source_ids)
+        now = time.time()
+        # SQLite limits the number of bound parameters, so look up in chunks
+        for i in range(0, len(source_ids), 500):
+            chunk = source_ids[i:i+500]
+            placeholders = ",".join("?" * len(chunk))
+            cur.execute(f'''
+                SELECT source_id, target_id, matched_at
+                FROM track_matches
+                WHERE source = ? AND source_id IN ({placeholders})
+            ''', (source, *chunk))
+            for source_id, target_id, matched_at in cur.fetchall():
+                if target_id is None and miss_ttl is not None and now - (matched_at or 0) > miss_ttl:
+                    continue # Expired miss
+                matches[source_id] = target_id
+        return matches
+
+    @_writes
+    def save_track_matches(self, source, matches, method='search'):
+        """
+        Stores match results. matches: iterable of (source_id, target_id) pairs or
+        (source_id, target_id, method) triples; target_id None records a miss.
+        method: how the match was found ('isrc' or 'search').
+        """
+        now = time.time()
+        rows = [(source, m[0], m[1], now, m[2] if len(m) > 2 else method) for m in matches]
+        self.cursor.executemany('''
+            INSERT OR REPLACE INTO track_matches (source, source_id, target_id, matched_at, method)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        self.conn.commit()
+
+    def get_track_isrcs(self, video_ids):
+        """Returns {video_id: isrc} for the given tracks that have a known ISRC."""
+        cur = self._read_cursor()
+        video_ids = list(video_ids)
+        isrcs = {}
+        for i in range(0, len(video_ids), 500):
+            chunk = video_ids[i:i+500]
+            placeholders = ",".join("?" * len(chunk))
+            cur.execute(f'SELECT video_id, isrc FROM tracks WHERE isrc IS NOT NULL AND video_id IN ({placeholders})', chunk)
+            isrcs.update(cur.fetchall())
+        return isrcs
+
+    def get_videos_by_isrc(self, isrcs):
+        """Returns {isrc: video_id} for the given ISRCs that a library track is known to carry."""
+        cur = self._read_cursor()
+        isrcs = list(set(isrcs))
+        videos = {}
+        for i in range(0, len(isrcs), 500):
+            chunk = isrcs[i:i+500]
+            placeholders = ",".join("?" * len(chunk))
+            cur.execute(f'SELECT isrc, video_id FROM tracks WHERE isrc IN ({placeholders})', chunk)
+            videos.update(cur.fetchall())
+        return videos
+
+    @_writes
+    def set_track_isrcs(self, pairs):
+        """Records ISRCs learned elsewhere (e.g. from a confident Spotify match): (video_id, isrc) pairs."""
+        self.cursor.executemany(
+            'UPDATE tracks SET isrc = ? WHERE video_id = ? AND isrc IS NULL',
+            [(isrc, vid) for vid, isrc in pairs if isrc]
+        )
+        self.conn.commit()
+
+    def get_spotify_playlists(self, owner_id):
+        """
+        Returns (playlists, refreshed_at) for a Spotify account: the stored index as
+        [{'id', 'name', 'snapshot_id'}] (listing order) and when it was last fully listed.
+        refreshed_at is None if the account was never listed.
+        """
+        cur = self._read_cursor()
+        cur.execute("SELECT id, name, snapshot_id FROM spotify_playlists WHERE owner_id = ? ORDER BY rowid", (owner_id,))
+        playlists = [{'id': r[0], 'name': r[1], 'snapshot_id': r[2]} for r in cur.fetchall()]
+        refreshed_at = self.get_meta(f"spotify_playlists_refreshed_at:{owner_id}")
+        return playlists, float(refreshed_at) if refreshed_at else None
+
+    @_writes
+    def replace_spotify_playlists(self, owner_id, playlists):
+        """Stores a complete playlist listing for an account, replacing the previous one."""
+        self.cursor.execute("DELETE FROM spotify_playlists WHERE owner_id = ?", (owner_id,))
+        self.cursor.executemany(
+            "INSERT OR REPLACE INTO spotify_playlists (id, owner_id, name, snapshot_id) VALUES (?, ?, ?, ?)",
+            [(p['id'], owner_id, p['name'], p.get('snapshot_id')) for p in playlists]
+        )
+        self.cursor.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (f"spotify_playlists_refreshed_at:{owner_id}", str(time.time()))
+        )
+        self.conn.commit()
+
+    @_writes
+    def save_spotify_playlist(self, owner_id, playlist_id, name, snapshot_id=None):
+        """Adds (or renames) one playlist in the stored index, e.g. right after creating it."""
+        self.cursor.execute('''
+            INSERT INTO spotify_playlists (id, owner_id, name, snapshot_id) VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET name = excluded.name, snapshot_id = excluded.snapshot_id
+        ''', (playlist_id, owner_id, name, snapshot_id))
+        self.conn.commit()
+
+    def get_sync_state(self, yt_playlist_id, sp_playlist_id):
+        """
+        Returns {'snapshot_id', 'uris', 'yt_fingerprint', 'mode', 'synced_at'} from the
+        last sync of this pair, or None.
+        """
+        cur = self._read_cursor()
+        cur.execute('''
+            SELECT snapshot_id, uris, yt_fingerprint, mode, synced_at FROM sync_state
+            WHERE yt_playlist_id = ? AND sp_playlist_id = ?
+        ''', (yt_playlist_id, sp_playlist_id))
+        row = cur.fetchone()
+        if not row:
+            return None
+        return {'snapshot_id': row[0], 'uris': json.loads(row[1] or '[]'), 'yt_fingerprint': row[2],
+                'mode': row[3], 'synced_at': row[4]}
+
+    @_writes
+    def save_sync_state(self, yt_playlist_id, sp_playlist_id, snapshot_id, uris, yt_fingerprint=None, mode='mirror'):
+        """
+        Records the Spotify playlist's contents (ordered URIs) as of snapshot_id, and the
+        fingerprint of the YouTube playlist they were synced from (None = don't trust it).
+        """
         self.cursor.execute('''
-            SELECT rowid, title, artist, album 
-            FROM tracks_fts 
-            WHERE tracks_fts MATCH ? 
-            ORDER BY rank 
-            LIMIT 50
-        ''', (fts_query,))
-        return [{'id': r[0], 'title': r[1], 'artist': r[2], 'album': r[3]} for r in self.cursor.fetchall()]
+            INSERT OR REPLACE INTO sync_state (yt_playlist_id, sp_playlist_id, snapshot_id, uris, yt_fingerprint, mode, synced_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (yt_playlist_id, sp_playlist_id, snapshot_id, json.dumps(uris), yt_fingerprint, mode, time.time()))
+        self.conn.commit()
+
+    def get_restore_journal(self):
+        """
+        Returns {original playlist_id: {'new_playlist_id', 'status', 'total', 'done', 'skipped',
+        'error', 'updated_at'}}. 'done' counts leading tracks already handled (added or skipped).
+        """
+        cur = self._read_cursor()
+        cur.execute('SELECT playlist_id, new_playlist_id, status, total, done, skipped, error, updated_at FROM restore_journal')
+        return {
+            row[0]: {'new_playlist_id': row[1], 'status': row[2], 'total': row[3], 'done': row[4] or 0,
+                     'skipped': json.loads(row[5] or '[]'), 'error': row[6], 'updated_at': row[7]}
+            for row in cur.fetchall()
+        }
+
+    @_writes
+    def save_restore_checkpoint(self, playlist_id, status, new_playlist_id=None, total=None, done=0, skipped=None, error=None):
+        """Records a restore checkpoint for one playlist (replaces the previous one)."""
+        self.cursor.execute('''
+            INSERT OR REPLACE INTO restore_journal (playlist_id, new_playlist_id, status, total, done, skipped, error, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (playlist_id, new_playlist_id, status, total, done, json.dumps(skipped or []), error, time.time()))
+        self.conn.commit()
+
+    @_writes
+    def clear_restore_journal(self):
+        self.cursor.execute('DELETE FROM restore_journal')
+        self.conn.commit()
 
+    @_writes
     def cleanup_orphans(self):
         """Removes tracks and artists not linked to anything."""
         # Delete orphan tracks (not in any playlist)
@@ -272,55 +1149,51 @@ class DBManager:
             WHERE id NOT IN (SELECT DISTINCT artist_id FROM track_artists)
         ''')
         deleted_artists = self.cursor.rowcount
+        self._artist_ids.clear() # Cached ids may point at deleted artists
         
         self.conn.commit()
         return deleted_tracks, deleted_artists
 
-    def get_global_duplicates(self):
+    def get_global_duplicates(self, limit=None, offset=0):
         """
-        Finds tracks that exist in more than one playlist.
-        Returns a list of dicts:
-        [{
+        Finds tracks that exist in more than one playlist, ordered by artist and title.
+        Yields dicts (one aggregate query, streamed row by row):
+        {
             'video_id': '...',
             'title': '...',
             'artist': '...',
             'playlists': [{'id': '...', 'title': '...'}, ...]
-        }, ...]
+        }
+        limit/offset page through the report without materializing all of it.
         """
-        # Find video_ids with > 1 playlist
-        self.cursor.execute('''
-            SELECT video_id, COUNT(DISTINCT playlist_id) as cnt
-            FROM playlist_tracks
-            GROUP BY video_id
-            HAVING cnt > 1
-        ''')
-        duplicate_ids = [row[0] for row in self.cursor.fetchall()]
+        cur = self._read_cursor()
+        cur.execute('''
+            SELECT d.video_id, d.title, d.artist,
+                   json_group_array(json_object('id', p.id, 'title', p.title))
+            FROM (
+                SELECT t.video_id, t.title, t.artist
+                FROM playlist_tracks pt
+                JOIN tracks t ON pt.video_id = t.video_id
+                GROUP BY t.video_id
+                HAVING COUNT(DISTINCT pt.playlist_id) > 1
+                ORDER BY t.artist, t.title, t.video_id
+                LIMIT ? OFFSET ?
+            ) d
+            JOIN (SELECT DISTINCT playlist_id, video_id FROM playlist_tracks) pt ON pt.video_id = d.video_id
+            JOIN playlists p ON p.id = pt.playlist_id
+            GROUP BY d.video_id
+            ORDER BY d.artist, d.title, d.video_id
+        ''', (-1 if limit is None else limit, offset))
         
-        results = []
-        for vid in duplicate_ids:
-            # Get track info
-            self.cursor.execute("SELECT title, artist FROM tracks WHERE video_id = ?", (vid,))
-            track_info = self.cursor.fetchone()
-            if not track_info: continue
-            
-            # Get playlists (Unique)
-            self.cursor.execute('''
-                SELECT DISTINCT p.id, p.title 
-                FROM playlists p
-                JOIN playlist_tracks pt ON p.id = pt.playlist_id
-                WHERE pt.video_id = ?
-            ''', (vid,))
-            playlists = [{'id': r[0], 'title': r[1]} for r in self.cursor.fetchall()]
-            
-            results.append({
-                'video_id': vid,
-                'title': track_info[0],
-                'artist': track_info[1],
-                'playlists': playlists
-            })
-            
-        return results
+        for video_id, title, artist, playlists in cur:
+            yield {
+                'video_id': video_id,
+                'title': title,
+                'artist': artist,
+                'playlists': json.loads(playlists)
+            }
 
+    @_writes
     def remove_local_duplicates(self):
         """
         Removes duplicate entries from playlist_tracks table.
@@ -350,5 +1223,15 @@ class DBManager:
 
 
     def close(self):
+        # Readers first: the last connection to close checkpoints and removes the WAL files
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+        if self._writer:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
         if self.conn:
             self.conn.close()
+            self.conn = None
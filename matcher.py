@@ -0,0 +1,123 @@
+"""
+Scores search results against a source track on normalized title, artist
+overlap and duration, and returns the best candidate with a confidence (0-1).
+Uses rapidfuzz when it is installed (pip install rapidfuzz), difflib otherwise.
+"""
+import difflib
+import re
+from normalize import fold, split_artists, strip_featuring
+
+try:
+    from rapidfuzz import fuzz as _fuzz
+    BACKEND = 'rapidfuzz'
+except ImportError:
+    _fuzz = None
+    BACKEND = 'difflib'
+
+# Above this no broader search is needed; below MIN_CONFIDENCE the best candidate is treated as a miss
+ACCEPT_CONFIDENCE = 0.85
+MIN_CONFIDENCE = 0.7
+
+WEIGHTS = {'title': 0.5, 'artist': 0.35, 'duration': 0.15}
+
+_BRACKETED_RE = re.compile(r'[\(\[（【「『][^\)\]）】」』]*[\)\]）】」』]')
+# Bracketed fragments that describe the upload rather than the recording
+_NOISE_RE = re.compile(r'\b(official|video|audio|lyrics?|mv|hd|hq|4k|visuali[sz]er|topic)\b', re.IGNORECASE)
+# " - " / " ~ " separate alternate titles ("残響散歌 - Zankyosanka") or suffixes ("Song - Remastered")
+_PARTS_RE = re.compile(r'\s+[-–—~～]\s+')
+# Words that mark a different recording of the same song
+_VERSION_WORDS = {'remix', 'live', 'acoustic', 'instrumental', 'piano', 'cover', 'karaoke', 'edit',
+                  'mix', 'demo', 'sped', 'slowed', 'nightcore', 'orchestral', 'unplugged'}
+
+def clean_title(title):
+    """Drops "feat." credits and upload noise like "(Official Video)"; keeps "(Live)" etc."""
+    title = strip_featuring(title or '')
+    title = _BRACKETED_RE.sub(lambda m: ' ' if _NOISE_RE.search(m.group(0)) else m.group(0), title)
+    return ' '.join(title.split())
+
+def title_keys(title):
+    """Comparable forms of a title: the whole cleaned title, then each ' - ' part."""
+    base = clean_title(title)
+    keys = []
+    for key in [fold(base)] + [fold(part) for part in _PARTS_RE.split(base)]:
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+def search_title(title):
+    """Short title for a field-restricted search: first ' - ' part, no brackets or credits."""
+    main = _PARTS_RE.split(strip_featuring(title or ''))[0]
+    return ' '.join(_BRACKETED_RE.sub(' ', main).split()) or (title or '').strip()
+
+def versions(title):
+    return _VERSION_WORDS.intersection(re.findall(r'\w+', fold(title)))
+
+def parse_duration(value):
+    """Seconds from 185, '3:05' or '1:02:03'; None when unknown."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        seconds = 0
+        for part in str(value).split(':'):
+            seconds = seconds * 60 + int(part)
+        return float(seconds)
+    except ValueError:
+        return None
+
+def similarity(a, b):
+    """0-1 string similarity, tolerant to word order (extra words are handled by title_keys)."""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    if _fuzz:
+        return max(_fuzz.ratio(a, b), _fuzz.token_sort_ratio(a, b)) / 100
+    ratio = difflib.SequenceMatcher(None, a, b).ratio()
+    ordered = difflib.SequenceMatcher(None, ' '.join(sorted(a.split())), ' '.join(sorted(b.split()))).ratio()
+    return max(ratio, ordered)
+
+def _best(keys_a, keys_b):
+    return max((similarity(a, b) for a in keys_a for b in keys_b), default=0.0)
+
+def _artist_score(query_artists, candidate_artists):
+    """70% how well the primary artist matches, 30% share of credited artists found."""
+    query = [split_artists(name) for name in query_artists if name]
+    candidate = [key for name in candidate_artists if name for key in split_artists(name)]
+    if not query or not candidate:
+        return 0.0
+    scores = [_best(keys, candidate) for keys in query]
+    found = sum(1 for s in scores if s >= 0.85) / len(scores)
+    return 0.7 * scores[0] + 0.3 * found
+
+def _duration_score(a, b):
+    """1 within 2s, falling to 0 at 22s apart."""
+    diff = abs(a - b)
+    return 1.0 if diff <= 2 else max(0.0, 1 - (diff - 2) / 20)
+
+def score(query, candidate):
+    """
+    Confidence that `candidate` is the same recording as `query`.
+    Both are dicts with 'title', 'artists' (list of names) and optional 'duration' (seconds).
+    """
+    title = _best(title_keys(query['title']), title_keys(candidate['title']))
+    if versions(query['title']) != versions(candidate['title']):
+        title *= 0.5 # "Song (Live)" is not "Song"
+    parts = {'title': title, 'artist': _artist_score(query.get('artists') or [], candidate.get('artists') or [])}
+    if query.get('duration') and candidate.get('duration'):
+        parts['duration'] = _duration_score(query['duration'], candidate['duration'])
+    total_weight = sum(WEIGHTS[k] for k in parts)
+    confidence = sum(WEIGHTS[k] * v for k, v in parts.items()) / total_weight
+    if min(parts['title'], parts['artist']) < 0.5:
+        confidence *= 0.8 # Right title by the wrong artist (or vice versa) is not a match
+    return confidence
+
+def best_match(query, candidates):
+    """Returns (best candidate, confidence), or (None, 0.0) when there are no candidates."""
+    best, best_score = None, 0.0
+    for candidate in candidates:
+        s = score(query, candidate)
+        if s > best_score:
+            best, best_score = candidate, s
+    return best, best_score
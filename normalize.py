@@ -0,0 +1,45 @@
+import re
+import unicodedata
+
+# "feat. X", "ft X", "featuring X" (and the bracketed forms) up to the end or a closing bracket
+_FEAT_RE = re.compile(r'[\(\[]?\s*\b(?:feat|ft|featuring)\b\.?\s+[^\)\]]*[\)\]]?', re.IGNORECASE)
+# Separators used inside a single credited artist string ("&" / "and" are left alone:
+# too many real names contain them, e.g. "Mumford & Sons")
+_SPLIT_RE = re.compile(r'\s*(?:,|\b(?:feat|ft|featuring)\b\.?)\s*', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+_BRACKETS_RE = re.compile(r'[\(\)\[\]]')
+
+def _strip_accent(char):
+    # Only Latin letters lose their marks; kana dakuten etc. change the word, so they stay
+    if char.isascii():
+        return char
+    decomposed = unicodedata.normalize('NFKD', char)
+    if unicodedata.name(decomposed[0], '').startswith('LATIN'):
+        return ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return unicodedata.normalize('NFKC', char)
+
+def fold(text):
+    """Case folds and strips accents: 'Cö shu Nie' -> 'co shu nie', 'BÔA' -> 'boa'."""
+    stripped = ''.join(_strip_accent(c) for c in unicodedata.normalize('NFC', text or ''))
+    return _SPACE_RE.sub(' ', _BRACKETS_RE.sub(' ', stripped.casefold())).strip()
+
+def strip_featuring(text):
+    """Removes "feat. X" / "(ft. X)" credits from an artist or title string."""
+    return _FEAT_RE.sub(' ', text or '')
+
+def normalize_artist(name):
+    """Matching key for an artist name (folded, featured artists removed)."""
+    return fold(strip_featuring(name))
+
+def split_artists(name):
+    """
+    Splits a credited artist string into individual matching keys:
+    'Young Franco, Pell' -> ['young franco, pell', 'young franco', 'pell'],
+    'A feat. B' -> ['a', 'b'].
+    Keys keep their credit order; the full folded name comes first when it differs.
+    """
+    keys = []
+    for candidate in [normalize_artist(name)] + [fold(p) for p in _SPLIT_RE.split(name or '')]:
+        if candidate and candidate not in keys:
+            keys.append(candidate)
+    return keys
@@ -0,0 +1,40 @@
+import bisect
+
+def longest_increasing_subsequence(values):
+    """Returns the set of indexes of one longest strictly increasing subsequence (O(n log n))."""
+    tails = []          # tails[k] = index of the smallest tail of an increasing run of length k+1
+    tail_values = []
+    parent = [-1] * len(values)
+    for i, v in enumerate(values):
+        k = bisect.bisect_left(tail_values, v)
+        if k:
+            parent[i] = tails[k - 1]
+        if k == len(tails):
+            tails.append(i)
+            tail_values.append(v)
+        else:
+            tails[k] = i
+            tail_values[k] = v
+    result = set()
+    i = tails[-1] if tails else -1
+    while i != -1:
+        result.add(i)
+        i = parent[i]
+    return result
+
+def plan_moves(current, target):
+    """
+    Fewest "move X right before Y" steps that turn `current` into `target`
+    (both lists of the same unique items). Items on the longest increasing
+    subsequence stay put; every other item moves exactly once.
+    Returns [(item, successor)] in execution order; successor None = move to the end.
+    """
+    rank = {item: r for r, item in enumerate(target)}
+    keep = {current[i] for i in longest_increasing_subsequence([rank[item] for item in current])}
+    # Walk the target backwards: each moved item goes right before its target successor,
+    # which is already in its final place relative to everything after it.
+    return [
+        (target[r], target[r + 1] if r + 1 < len(target) else None)
+        for r in range(len(target) - 1, -1, -1)
+        if target[r] not in keep
+    ]
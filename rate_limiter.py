@@ -0,0 +1,88 @@
+import re
+import threading
+import time
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker that talks to the same API.
+    rate: requests allowed per second, capacity: maximum burst size.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity else max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stops all callers for `seconds` (e.g. the server sent Retry-After)."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self.updated = self.blocked_until
+
+def retry_after(exc, default=1.0):
+    """Reads the Retry-After header (seconds) from an HTTP exception, if present."""
+    headers = getattr(exc, 'headers', None) or {}
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+def http_status(exc):
+    """Best-effort HTTP status code of an API exception (None if unknown)."""
+    for attr in ('http_status', 'status_code', 'status'):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    match = re.search(r'HTTP (\d{3})', str(exc))
+    return int(match.group(1)) if match else None
+
+def is_throttled(exc):
+    """True for errors that mean "slow down" (429 / 5xx) rather than "bad request"."""
+    status = http_status(exc)
+    return status == 429 or (status is not None and status >= 500)
+
+class BatchTuner:
+    """
+    Adapts request batch size and inter-request delay from observed outcomes
+    (AIMD): fast successes grow the batch and shrink the delay, throttling
+    halves the batch and doubles the delay.
+    """
+    def __init__(self, size=50, min_size=5, max_size=100, delay=0.5, min_delay=0.1, max_delay=30.0, target_latency=2.0):
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.delay = delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.target_latency = target_latency
+
+    def success(self, latency):
+        if latency > self.target_latency:
+            self.size = max(self.min_size, self.size // 2)
+        else:
+            self.size = min(self.max_size, self.size + max(1, self.size // 4))
+            self.delay = max(self.min_delay, self.delay * 0.8)
+
+    def throttled(self, wait=None):
+        self.size = max(self.min_size, self.size // 2)
+        self.delay = min(self.max_delay, max(self.delay * 2, wait or 0))
@@ -1,70 +1,157 @@
 from db_manager import DBManager
 from sorter import PlaylistManager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import backup
+import argparse
 import time
 
-def restore_library(progress_callback=None):
+def _restore_playlist(db, pm, playlist, entry, adopted):
+    """
+    Restores one playlist, checkpointing into the restore journal after creation and
+    after every batch, so a crash resumes where it stopped instead of creating a
+    second "[Restored]" copy. A batch sent right before a crash may be added twice.
+    Returns a one-line summary.
+    """
+    original_id = playlist['id']
+    title = playlist['title']
+    new_title = f"{title} [Restored]" # Tag to indicate it's a restored playlist
+
+    video_ids = playlist['tracks']
+    total = len(video_ids)
+    if not video_ids:
+        db.save_restore_checkpoint(original_id, 'done', total=0)
+        return "no tracks in backup, skipped"
+
+    new_pid = entry.get('new_playlist_id')
+    if not new_pid and entry.get('status') == 'creating':
+        new_pid = adopted.get(new_title) # Only a creation this restore started and lost track of
+    done = entry.get('done', 0) if entry.get('new_playlist_id') else 0
+    skipped = entry.get('skipped', []) if done else []
+    try:
+        if not new_pid:
+            # Journaled before the call: if we crash mid-create, the next run adopts the playlist by title
+            db.save_restore_checkpoint(original_id, 'creating', total=total)
+            new_pid = pm.create_playlist(new_title, playlist['description'] or "Restored from backup")
+            db.save_restore_checkpoint(original_id, 'adding', new_pid, total)
+
+        def checkpoint(report):
+            handled = done + report['added'] + len(report['skipped'])
+            db.save_restore_checkpoint(original_id, 'adding', new_pid, total, handled, skipped + report['skipped'])
+
+        # Adaptive batches; pacing and bad-id isolation live in the writer
+        report = pm.add_items_internal_robust(new_pid, video_ids[done:], on_progress=checkpoint)
+        skipped = skipped + report['skipped']
+        db.save_restore_checkpoint(original_id, 'done', new_pid, total, total, skipped)
+    except Exception as e:
+        current = db.get_restore_journal().get(original_id, {})
+        db.save_restore_checkpoint(original_id, 'failed', new_pid, total, current.get('done', done),
+                                   current.get('skipped', skipped), str(e))
+        raise
+
+    resumed = f", resumed at track {done + 1}" if done else ""
+    summary = f"{new_title} ({new_pid}): added {report['added']}/{total - done} in {report['requests']} requests{resumed}"
+    for s in report['skipped']:
+        summary += f"\n  - Skipped {s['videoId']}: {s['error']}"
+    return summary
+
+def restore_library(progress_callback=None, workers=4, restart=False, safety_delay=5, source=None):
+    """
+    Recreates every playlist of the backup on YouTube Music as "<title> [Restored]".
+    source: None reads the local database; a path reads a backup file written by
+    backup.export_library (JSON or NDJSON, optionally gzipped), streamed one playlist
+    at a time, so a fresh machine can restore without rebuilding the database first.
+    Progress is journaled per playlist and per batch: running again after a crash resumes
+    unfinished playlists and skips finished ones (restart=True forgets the journal).
+    Playlists are restored `workers` at a time, sharing the PlaylistManager request budget.
+    """
     print("=== STARTING LIBRARY RESTORATION ===")
-    print("WARNING: This will create new playlists in your YouTube Music account based on the local database.")
-    print("You have 5 seconds to cancel (Ctrl+C)...")
-    
-    if progress_callback:
-        progress_callback(0, 0, "Waiting 5s (Safety Delay)...")
-    
-    time.sleep(5)
+    db = DBManager() # Also holds the journal when restoring from a file
+    if restart:
+        db.clear_restore_journal()
+    journal = db.get_restore_journal()
 
-    db = DBManager()
-    pm = PlaylistManager()
+    if source:
+        print(f"Reading playlists from {source}.")
+        playlists = backup.read_backup(source)
+        total_playlists = 0 # Unknown until the file has been read
+    else:
+        stored = db.get_all_playlists()
+        total_playlists = len(stored)
+        print(f"Found {total_playlists} playlists in backup.")
+        if not stored:
+            db.close()
+            return
+        if all(journal.get(p['id'], {}).get('status') == 'done' for p in stored):
+            print("Nothing to restore: a previous run already restored every playlist (use --restart to restore again).")
+            db.close()
+            return
+        playlists = backup.iter_playlists(db)
 
-    # 1. Get all playlists from DB
-    playlists = db.get_all_playlists()
-    total_playlists = len(playlists)
-    print(f"Found {total_playlists} playlists in backup.")
-
-    for i, p in enumerate(playlists):
-        original_id = p['id']
-        title = p['title']
-        description = p['description']
-        
-        # Add a tag to indicate it's a restored playlist
-        new_title = f"{title} [Restored]"
-        
-        msg = f"Restoring: {title}..."
-        print(f"\n[{i+1}/{total_playlists}] {msg}")
-        
+    if any(entry['status'] != 'done' for entry in journal.values()):
+        # The user already confirmed this restore when it started
+        finished = sum(1 for entry in journal.values() if entry['status'] == 'done')
+        print(f"Resuming previous restore: {finished} playlists done.")
+    else:
+        print("WARNING: This will create new playlists in your YouTube Music account based on the backup.")
+        print(f"You have {safety_delay} seconds to cancel (Ctrl+C)...")
         if progress_callback:
-            progress_callback(i+1, total_playlists, msg)
-        
-        # 2. Get tracks for this playlist
-        video_ids = db.get_playlist_tracks(original_id)
-        if not video_ids:
-            print("  - No tracks found in backup. Skipping.")
-            continue
-            
-        print(f"  - Found {len(video_ids)} tracks.")
-        
-        # 3. Create new playlist on YouTube
+            progress_callback(0, 0, f"Waiting {safety_delay}s (Safety Delay)...")
+        time.sleep(safety_delay)
+
+    pm = PlaylistManager()
+
+    # Playlists whose creation was interrupted before its id was journaled are adopted by title
+    adopted = {}
+    if any(entry['status'] == 'creating' for entry in journal.values()):
+        adopted = {p['title']: p['playlistId'] for p in pm.get_my_playlists()}
+
+    counts = {'done': 0, 'restored': 0, 'failed': 0, 'previously': 0}
+
+    def report(future, title):
+        counts['done'] += 1
+        position = f"{counts['done']}/{total_playlists}" if total_playlists else counts['done']
         try:
-            new_pid = pm.create_playlist(new_title, description if description else "Restored from backup")
-            print(f"  - Created new playlist: {new_title} ({new_pid})")
-            
-            # 4. Add tracks
-            # YTMusic API can handle lists of video IDs
-            # But let's do it in chunks if it's too big? 
-            # add_playlist_items usually handles it, but let's be safe with chunks of 50 if needed.
-            # Actually, the library handles it pretty well.
-            
-            status = pm.add_tracks(new_pid, video_ids)
-            print(f"  - Added tracks. Status: {status}")
-            
+            print(f"[{position}] {title}: {future.result()}")
+            counts['restored'] += 1
         except Exception as e:
-            print(f"  - FAILED to restore {title}: {e}")
-            
-        time.sleep(2) # Rate limiting
+            counts['failed'] += 1
+            print(f"[{position}] {title}: FAILED ({e}), will resume on the next run")
+        if progress_callback:
+            progress_callback(counts['done'], total_playlists, f"Restored: {title}")
+
+    # Bounded submission: only a few playlists (and their track lists) are in memory at once
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for playlist in playlists:
+            if journal.get(playlist['id'], {}).get('status') == 'done':
+                counts['done'] += 1
+                counts['previously'] += 1
+                continue
+            future = executor.submit(_restore_playlist, db, pm, playlist, journal.get(playlist['id'], {}), adopted)
+            in_flight[future] = playlist['title']
+            if len(in_flight) >= 2 * max(1, workers):
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    report(f, in_flight.pop(f))
+        for f in list(in_flight):
+            f.exception() # Waits, in submission order
+            report(f, in_flight.pop(f))
 
-    print("\n=== RESTORATION COMPLETE ===")
+    if not counts['restored'] and not counts['failed'] and counts['previously']:
+        print("Nothing to restore: a previous run already restored every playlist (use --restart to restore again).")
+    elif counts['failed']:
+        print(f"\n=== RESTORATION INCOMPLETE ({counts['failed']} failed) ===")
+    else:
+        print("\n=== RESTORATION COMPLETE ===")
     if progress_callback:
-        progress_callback(total_playlists, total_playlists, "Restoration Complete!")
+        progress_callback(counts['done'], total_playlists or counts['done'], "Restoration Complete!")
     db.close()
 
 if __name__ == "__main__":
-    restore_library()
+    parser = argparse.ArgumentParser(description="Restore the library backup to YouTube Music")
+    parser.add_argument('--from', dest='source', metavar='PATH',
+                        help='Restore from a backup file (json/ndjson, .gz ok) instead of music_library.db')
+    parser.add_argument('--workers', type=int, default=4, help='Playlists restored concurrently (they share one request budget)')
+    parser.add_argument('--restart', action='store_true', help='Forget the restore journal and restore every playlist again')
+    args = parser.parse_args()
+    restore_library(workers=args.workers, restart=args.restart, source=args.source)
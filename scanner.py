@@ -1,16 +1,45 @@
-from sorter import PlaylistManager
+from sorter import PlaylistManager, listing_signature, playlist_fingerprint
 from db_manager import DBManager
+import backup
 import time
+import json
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from logger_setup import setup_logger
 
 logger = setup_logger()
 
 def fetch_tracks(pm, pid):
-    """Helper to fetch tracks in a thread."""
-    return pid, pm.get_playlist_tracks(pid)
+    """Helper to fetch tracks in a thread (always from the network: the scan feeds the cache)."""
+    tracks, source = pm.get_playlist_tracks(pid, max_age=0, with_source=True)
+    return pid, tracks, source
 
-def scan_library(progress_callback=None, force_update=False):
+def scan_decision(state, remote_count, signature, force_update, verify_after):
+    """Returns (should_scan, reason) for one playlist."""
+    if force_update:
+        return True, "forced"
+    if not state or not state.get('fingerprint'):
+        return True, "never scanned"
+    local_count = state.get('track_count')
+    if local_count != remote_count:
+        return True, f"track count changed ({local_count} -> {remote_count})"
+    if state.get('listing_signature') != signature:
+        return True, "listing changed"
+    age = time.time() - (state.get('scanned_at') or 0)
+    if age > verify_after:
+        return True, f"verification due (last scanned {int(age // 86400)} days ago)"
+    return False, "unchanged"
+
+def scan_library(progress_callback=None, force_update=False, verify_after_days=7,
+                 backup_path='library_backup.json', backup_format='json', csv_path='library_export.csv'):
+    """
+    Scans the YouTube library into the local DB.
+    Playlists are only fetched when their count or listing signature changed, or
+    when the last full fetch is older than verify_after_days (catches swapped songs
+    that don't change the cover). A fetched playlist whose content fingerprint is
+    unchanged is not rewritten.
+    The backup (backup_format 'json' or 'ndjson', gzip if backup_path ends in .gz)
+    and the CSV track export are rewritten only when their content changed.
+    """
     pm = PlaylistManager()
     db = DBManager()
     
@@ -18,10 +47,10 @@ def scan_library(progress_callback=None, force_update=False):
     if progress_callback:
         progress_callback(0, 0, "Fetching playlists...")
         
-    playlists = pm.get_my_playlists()
+    playlists = pm.get_my_playlists(refresh=True) # The scan's whole point is the current remote state
     
     skipped_count = 0
-    result = {'scanned': 0, 'skipped': 0, 'orphans_removed': 0, 'added_songs': {}}
+    result = {'scanned': 0, 'skipped': 0, 'orphans_removed': 0, 'added_songs': {}, 'scan_reasons': {}, 'skip_reasons': {}}
     
     # Filter out system playlists
     ignored_ids = ['LM', 'SE']
@@ -46,46 +75,57 @@ def scan_library(progress_callback=None, force_update=False):
     
     # --- SYNC DELETIONS ---
     # (Keep existing deletion logic)
-    db.cursor.execute("SELECT id, track_count FROM playlists")
-    local_data = {row[0]: row[1] for row in db.cursor.fetchall()}
+    local_data = db.get_playlist_scan_state()
     local_ids = set(local_data.keys())
     remote_ids = {p['playlistId'] for p in valid_playlists}
     
     to_delete = local_ids - remote_ids
     if to_delete:
         # logger.info(f"Found {len(to_delete)} stale playlists to remove.")
-        for pid in to_delete:
-            # logger.info(f"Removing stale playlist: {pid}")
-            db.cursor.execute("DELETE FROM playlists WHERE id = ?", (pid,))
-            db.cursor.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (pid,))
-        db.commit()
+        db.remove_playlists(to_delete)
     # ----------------------
 
     # Identify playlists to scan vs skip
     to_scan = []
     skipped_count = 0
     
+    verify_after = verify_after_days * 86400
+    signatures = {}
+    
     for i, p in enumerate(valid_playlists):
         title = p['title']
         pid = p['playlistId']
         remote_count = int(p.get('count', 0) if p.get('count') else 0)
-        local_count = int(local_data.get(pid, -1))
+        signatures[pid] = listing_signature(p)
+        should_scan, reason = scan_decision(local_data.get(pid), remote_count, signatures[pid], force_update, verify_after)
         
         # Always update metadata
         db.add_playlist(pid, title, p.get('description', ''), remote_count)
         
-        if not force_update and local_count == remote_count:
+        if not should_scan:
             skipped_count += 1
-            # msg = f"Skipping: {title} (No changes)" # Redundant
-            logger.debug(f"Skipping: {title} (No changes)")
+            result['skip_reasons'][pid] = {'title': title, 'reason': reason}
+            logger.debug(f"Skipping: {title} ({reason})")
             if progress_callback:
                 progress_callback(i+1, total, f"Skipping: {title}")
         else:
+            result['scan_reasons'][pid] = {'title': title, 'reason': reason}
+            logger.debug(f"Queued for scan: {title} ({reason})")
             to_scan.append((i, p))
+    db.commit()
+
+    # Rewriting most of the library: index once at the end instead of per row.
+    # (If we die before resume_fts, the next DBManager rebuilds the index on open.)
+    bulk_fts = force_update or len(to_scan) * 2 > total
+    if bulk_fts:
+        db.suspend_fts()
 
     # Parallel Scan for the rest
+    # Fetches run on the pool; DB writes are queued to the DB writer thread so
+    # the main loop goes straight back to collecting the next finished fetch.
     if to_scan:
         logger.debug(f"Scanning {len(to_scan)} playlists in parallel...")
+        pending_writes = []
         with ThreadPoolExecutor(max_workers=5) as executor:
             # Submit all tasks
             future_to_meta = {
@@ -104,44 +144,59 @@ def scan_library(progress_callback=None, force_update=False):
                     progress_callback(i+1, total, msg)
                 
                 try:
-                    _, tracks = future.result()
-                    new_tracks_count = 0
-                    added_titles = []
-                    for t in tracks:
-                        if db.add_track(t, pid):
-                            new_tracks_count += 1
-                            added_titles.append(t.get('title', 'Unknown'))
-                    db.commit() # Commit this playlist
-                    
-                    if new_tracks_count > 0:
-                        logger.debug(f"Added {new_tracks_count} new tracks to {title}")
-                        if 'added_songs' not in result: result['added_songs'] = {}
-                        result['added_songs'][title] = added_titles
-                        
+                    _, tracks, source = future.result()
+                    if source != 'network':
+                        # API failed and the manager fell back to our own DB: nothing new to store
+                        logger.error(f"Error scanning {title}: could not fetch from YouTube")
+                        continue
+                    fingerprint = playlist_fingerprint(tracks)
+                    if not force_update and fingerprint == (local_data.get(pid) or {}).get('fingerprint'):
+                        # Listing looked different but the items are identical: nothing to write
+                        skipped_count += 1
+                        result['skip_reasons'][pid] = {'title': title, 'reason': "content unchanged"}
+                        del result['scan_reasons'][pid]
+                        logger.debug(f"Skipping writes: {title} (content unchanged)")
+                        db.submit(db.set_playlist_scan_state, pid, fingerprint, signatures[pid])
+                        db.submit(db.commit)
+                    else:
+                        # Scan state is committed with the links, only if the sync succeeds
+                        scan_state = (fingerprint, signatures[pid])
+                        pending_writes.append((title, db.submit(db.sync_playlist_tracks, pid, tracks, scan_state)))
                 except Exception as e:
                     logger.error(f"Error scanning {title}: {e}")
 
+        for title, write in pending_writes:
+            try:
+                changes = write.result()
+                new_tracks = changes['new_tracks']
+                logger.debug(f"{title}: +{changes['inserted']} -{changes['removed']} ~{changes['moved']} links")
+                new_tracks_count = len(new_tracks)
+                added_titles = [t.get('title', 'Unknown') for t in new_tracks]
+                
+                if new_tracks_count > 0:
+                    logger.debug(f"Added {new_tracks_count} new tracks to {title}")
+                    if 'added_songs' not in result: result['added_songs'] = {}
+                    result['added_songs'][title] = added_titles
+                    
+            except Exception as e:
+                logger.error(f"Error scanning {title}: {e}")
+
     # --- CLEANUP & EXPORT ---
     logger.debug("") # Force newline to clear header from progress bar
     logger.debug("Running database cleanup...")
     dt, da = db.cleanup_orphans()
     if dt > 0 or da > 0:
         logger.debug(f"Cleaned {dt} orphan tracks and {da} orphan artists.")
+    if bulk_fts:
+        logger.debug("Rebuilding search index...")
+        db.resume_fts()
         
     logger.debug("Exporting library backup...")
     try:
-        import json
-        playlists = db.get_all_playlists()
-        library_data = {'playlists': []}
-        
-        for p in playlists:
-            tracks = db.get_playlist_tracks(p['id'])
-            p['tracks'] = tracks
-            library_data['playlists'].append(p)
-            
-        with open('library_backup.json', 'w', encoding='utf-8') as f:
-            json.dump(library_data, f, indent=2, ensure_ascii=False)
-        logger.debug("Backup saved to library_backup.json")
+        status = backup.export_library(db, backup_path, fmt=backup_format)
+        logger.debug(f"Backup {'saved to' if status['written'] else 'unchanged:'} {status['path']}")
+        status = backup.export_tracks_csv(db, csv_path)
+        logger.debug(f"Track export {'saved to' if status['written'] else 'unchanged:'} {status['path']}")
     except Exception as e:
         logger.error(f"Backup failed: {e}")
     # ------------------------
@@ -151,8 +206,7 @@ def scan_library(progress_callback=None, force_update=False):
         progress_callback(total, total, "Done") # Standard completion signal within callback
         
     # Get final stats for report
-    db.cursor.execute("SELECT COUNT(*) FROM tracks")
-    final_tracks = db.cursor.fetchone()[0]
+    final_tracks = db.count_tracks()
     
     # Simple heuristic for "new" tracks in this session
     # Ideally we'd sum up new_tracks_count from threads, but threading makes it tricky to share a counter without a lock.
@@ -162,7 +216,7 @@ def scan_library(progress_callback=None, force_update=False):
     result.update({
         'total_playlists': total,
         'skipped': skipped_count,
-        'scanned': len(to_scan),
+        'scanned': len(result['scan_reasons']),
         'orphans_removed': dt,
         'found_playlists': [p['title'] for p in valid_playlists]
     })
@@ -170,7 +224,6 @@ def scan_library(progress_callback=None, force_update=False):
     db.close()
     
     # Persist scan status for 'sort' command visibility
-    import json
     try:
         status_data = {}
         if result.get('added_songs'):
@@ -6,9 +6,77 @@ import json
 import os
 import requests
 import logging
+import threading
+from collections import OrderedDict
+from normalize import split_artists
+from rate_limiter import BatchTuner, TokenBucket, http_status, is_throttled, retry_after
+from ordering import plan_moves
 
 logger = logging.getLogger("MusicBridge")
 
+def listing_signature(playlist):
+    """
+    Cheap change signal from the library listing (no track fetch): the track count
+    plus the cover thumbnails, which YouTube derives from the first tracks.
+    """
+    import hashlib
+    thumbs = [t.get('url') for t in playlist.get('thumbnails') or []]
+    payload = json.dumps([str(playlist.get('count') or 0), thumbs])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def playlist_fingerprint(tracks):
+    """Hash of the ordered playlist items (setVideoId identifies each entry, even duplicates)."""
+    import hashlib
+    items = [t.get('setVideoId') or t.get('videoId') or '' for t in tracks]
+    return hashlib.sha1("\n".join(items).encode('utf-8')).hexdigest()
+
+CHANNEL_META_KEY = 'youtube_auth_user' # Brand Account channel index found by the probe in get_my_playlists
+
+def sort_key(track):
+    """Artist (lowercase) -> Title (lowercase)."""
+    artist_list = track.get('artists') or []
+    artist = artist_list[0]['name'].lower() if artist_list else ""
+    title = (track.get('title') or '').lower()
+    return (artist, title)
+
+class _TrackListLRU:
+    """
+    Per-process memo of playlist track lists, least recently used evicted first.
+    Bounded by the total number of tracks held, not by playlist count.
+    """
+    def __init__(self, max_tracks=20000):
+        self.max_tracks = max_tracks
+        self._entries = OrderedDict() # playlist_id -> (fetched_at, tracks)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, playlist_id, max_age):
+        with self._lock:
+            entry = self._entries.get(playlist_id)
+            if not entry or time.time() - entry[0] > max_age:
+                return None
+            self._entries.move_to_end(playlist_id)
+            return list(entry[1])
+
+    def put(self, playlist_id, tracks):
+        with self._lock:
+            self._pop(playlist_id)
+            if len(tracks) > self.max_tracks:
+                return
+            self._entries[playlist_id] = (time.time(), list(tracks))
+            self._size += len(tracks)
+            while self._size > self.max_tracks:
+                self._pop(next(iter(self._entries)))
+
+    def discard(self, playlist_id):
+        with self._lock:
+            self._pop(playlist_id)
+
+    def _pop(self, playlist_id):
+        entry = self._entries.pop(playlist_id, None)
+        if entry:
+            self._size -= len(entry[1])
+
 class PlaylistManager:
     def __init__(self, auth_file='headers_auth.json', db_path='music_library.db'):
         self.db_path = db_path
@@ -89,12 +157,60 @@ class PlaylistManager:
                 config = json.load(f)
                 self.user_name = config['youtube'].get('user_filter', "Anthony Buitrago")
         except:
+            config = {}
             self.user_name = "Anthony Buitrago"
 
+        # Read-through track cache (music_library.db, filled by scan_library)
+        # A stored playlist is served locally when its listing entry (count + covers) is
+        # unchanged and it was scanned less than max age ago. 0 disables the cache.
+        self.cache_max_age = config.get('settings', {}).get('track_cache_max_age_minutes', 60) * 60
+        self._listing = None    # playlistId -> listing entry from the last get_my_playlists()
+        self._dirty = set()     # Playlists we modified in this process (cache is stale)
+        self._cache_db = None
+
+        # Per-process memos: the library listing (dropped by our own writes, see _touched)
+        # and recently fetched track lists
+        self._playlists = None
+        self._listing_lock = threading.Lock()
+        self._channel_checked = False
+        self._track_memo = _TrackListLRU(config.get('settings', {}).get('track_memo_max_tracks', 20000))
+
+        # Adaptive batch size / delay for playlist writes, shared by every add in this process
+        self.batch_tuner = BatchTuner()
+        # Request budget shared by every thread using this manager (see sort_many)
+        self.limiter = TokenBucket(config.get('sync', {}).get('youtube_requests_per_second', 5))
+
     # _get_access_token removed: No longer needed for Internal API via OAuth
 
-    def get_my_playlists(self):
-        """Returns a list of playlists using YouTube Internal API (OAuth or Cookies)."""
+    def get_my_playlists(self, refresh=False):
+        """
+        Returns a list of playlists using YouTube Internal API (OAuth or Cookies).
+        The listing is memoized for the life of this manager and dropped when we
+        create or modify a playlist; refresh=True always fetches.
+        """
+        with self._listing_lock:
+            if self._playlists is not None and not refresh:
+                return [dict(p) for p in self._playlists]
+            return self._fetch_playlists()
+
+    def _saved_channel(self):
+        try:
+            return self._get_cache_db().get_meta(CHANNEL_META_KEY)
+        except Exception:
+            return None # No local DB yet
+
+    def _save_channel(self, index):
+        try:
+            from db_manager import DBManager
+            db = DBManager(self.db_path)
+            try:
+                db.set_meta(CHANNEL_META_KEY, index)
+            finally:
+                db.close()
+        except Exception as e:
+            logger.debug(f"Could not remember channel index {index}: {e}")
+
+    def _fetch_playlists(self):
         logger.debug("ℹ️ Fetching playlists via Internal API...")
         
         if not self.yt:
@@ -102,33 +218,40 @@ class PlaylistManager:
             return []
 
         try:
+            # Brand Account found by an earlier run: go straight to it (unless the headers pick a channel)
+            probe = hasattr(self.yt, 'headers') and self.yt.headers.get('X-Goog-AuthUser', '0') == '0'
+            if probe and not self._channel_checked:
+                saved = self._saved_channel()
+                if saved and saved != '0':
+                    self.yt.headers['X-Goog-AuthUser'] = saved
+            self._channel_checked = True
+
             # Native ytmusicapi method (works with OAuth now)
             data = self.yt.get_library_playlists(limit=None)
             
             # --- AUTO-FIX: Brand Account / Channel Switcher ---
-            # If default channel (0) has no playlists, user likely has a "Brand Account".
+            # If the channel has no playlists, user likely has a "Brand Account".
             # We assume "no playlists" = wrong channel, because active users usually have at least "Your Likes".
-            if not data or len(data) == 0:
-                if hasattr(self.yt, 'headers'):
-                    # print("ℹ️ Default channel empty. Checking Brand Accounts...")
-                    current_auth_user = self.yt.headers.get('X-Goog-AuthUser', '0')
-                    
-                    # Only try if we are on default 0
-                    if current_auth_user == '0':
-                        for i in range(1, 5):
-                            self.yt.headers['X-Goog-AuthUser'] = str(i)
-                            try:
-                                # Quick check with small limit first? No, get_library is fast enough.
-                                check_data = self.yt.get_library_playlists(limit=None)
-                                if check_data and len(check_data) > 0:
-                                    print(f"✅ Found playlists on Channel Index {i}. Switching channel.")
-                                    data = check_data
-                                    break
-                            except Exception:
-                                continue
-                        else:
-                            # Reset if none found (optional, but good for cleanup)
-                            self.yt.headers['X-Goog-AuthUser'] = '0'
+            if (not data or len(data) == 0) and probe:
+                # print("ℹ️ Channel empty. Checking Brand Accounts...")
+                tried = self.yt.headers.get('X-Goog-AuthUser', '0')
+                for i in range(0, 5):
+                    if str(i) == tried:
+                        continue
+                    self.yt.headers['X-Goog-AuthUser'] = str(i)
+                    try:
+                        # Quick check with small limit first? No, get_library is fast enough.
+                        check_data = self.yt.get_library_playlists(limit=None)
+                        if check_data and len(check_data) > 0:
+                            print(f"✅ Found playlists on Channel Index {i}. Switching channel.")
+                            data = check_data
+                            self._save_channel(str(i)) # Later runs skip the probe
+                            break
+                    except Exception:
+                        continue
+                else:
+                    # Reset if none found (optional, but good for cleanup)
+                    self.yt.headers['X-Goog-AuthUser'] = '0'
             # --------------------------------------------------
             
             # Format to match our app's structure
@@ -143,15 +266,18 @@ class PlaylistManager:
                 playlists.append({
                     'playlistId': pid,
                     'title': item['title'],
-                    'count': item.get('count', 0) # Count might be missing or different
+                    'count': item.get('count', 0), # Count might be missing or different
+                    'thumbnails': item.get('thumbnails') or [] # Changes with the first tracks (scan change detection)
                 })
-            return playlists
+            self._listing = {p['playlistId']: p for p in playlists}
+            self._playlists = playlists
+            return [dict(p) for p in playlists]
             
         except Exception as e:
             print(f"Internal API failed: {e}. Falling back to Local Database...")
             try:
                 from db_manager import DBManager
-                db = DBManager(self.db_path)
+                db = DBManager(self.db_path, read_only=True)
                 db_playlists = db.get_all_playlists()
                 db.close()
                 params_blacklist = ["LM", "SE"]
@@ -168,7 +294,7 @@ class PlaylistManager:
         # print(f"Using Local Database for tracks (API Fallback) for {playlist_id}...") 
         try:
             from db_manager import DBManager
-            db = DBManager(self.db_path)
+            db = DBManager(self.db_path, read_only=True)
             tracks = db.get_playlist_tracks_details(playlist_id)
             db.close()
             return tracks
@@ -179,11 +305,12 @@ class PlaylistManager:
     def _fetch_internal_tracks_logic(self, playlist_id):
         # print("Falling back to Internal API (get_playlist)...")
         if not self.yt:
-             return self._fetch_db_tracks(playlist_id)
+             return self._fetch_db_tracks(playlist_id), 'db-fallback'
         
         try:
             # Internal API get_playlist returns dict with 'tracks' key
             # limit=None is important to get all tracks
+            self.limiter.acquire()
             data = self.yt.get_playlist(playlist_id, limit=None)
             
             # Logger context
@@ -192,7 +319,7 @@ class PlaylistManager:
             
             if not data or 'tracks' not in data:
                 logger.warning(f"Internal API returned invalid data for {playlist_id}. Falling back to DB.")
-                return self._fetch_db_tracks(playlist_id)
+                return self._fetch_db_tracks(playlist_id), 'db-fallback'
             
             formatted_tracks = []
             for t in data['tracks']:
@@ -214,12 +341,85 @@ class PlaylistManager:
                     'duration': t.get('duration', '0:00'),
                     'setVideoId': t.get('setVideoId', t.get('videoId'))
                 })
-            return formatted_tracks
+            return formatted_tracks, 'network'
         except Exception as e:
             logger.error(f"Internal API track fetch failed: {e}")
-            return self._fetch_db_tracks(playlist_id)
+            return self._fetch_db_tracks(playlist_id), 'db-fallback'
+
+    def _get_cache_db(self):
+        """Shared read-only handle on the local library DB (never blocks behind a scan)."""
+        if self._cache_db is None:
+            from db_manager import DBManager
+            self._cache_db = DBManager(self.db_path, read_only=True)
+        return self._cache_db
 
-    def get_playlist_tracks(self, playlist_id):
+    def _fetch_cached_tracks(self, playlist_id, max_age):
+        """
+        Returns the stored tracks if the local copy is fresh, else None.
+        Fresh = scanned less than max_age seconds ago and the playlist's listing entry
+        (count + cover thumbnails) still matches what the scan recorded.
+        """
+        try:
+            if not self._fresh_scan_state(playlist_id, max_age):
+                return None
+            return self._cache_db.get_playlist_tracks_details(playlist_id)
+        except Exception as e:
+            logger.debug(f"Track cache unavailable for {playlist_id}: {e}")
+            return None
+
+    def _fresh_scan_state(self, playlist_id, max_age):
+        """The playlist's stored scan state if the local copy is still fresh, else None."""
+        if playlist_id in self._dirty:
+            return None
+        state = self._get_cache_db().get_playlist_scan_state().get(playlist_id)
+        if not state or not state.get('fingerprint'):
+            return None
+        if time.time() - (state.get('scanned_at') or 0) > max_age:
+            return None
+        
+        if self._listing is None:
+            self.get_my_playlists() # One listing request covers every playlist
+        listed = (self._listing or {}).get(playlist_id)
+        if not listed or listing_signature(listed) != state.get('listing_signature'):
+            return None
+        return state
+
+    def local_fingerprint(self, playlist_id):
+        """
+        Content fingerprint (see playlist_fingerprint) from the last scan when the local
+        copy is still fresh, else None. Never fetches the playlist's tracks.
+        """
+        try:
+            state = self._fresh_scan_state(playlist_id, self.cache_max_age)
+            return state['fingerprint'] if state else None
+        except Exception as e:
+            logger.debug(f"No local fingerprint for {playlist_id}: {e}")
+            return None
+
+    def get_playlist_tracks(self, playlist_id, max_age=None, with_source=False):
+        """
+        Returns all tracks of a playlist, served from the local DB when fresh
+        (see _fetch_cached_tracks), otherwise from YouTube (DB fallback on errors).
+        max_age: cache max age in seconds (None = config default, 0 = always network).
+        Results are also kept in a per-process LRU (source 'memo'), dropped when we modify the playlist.
+        with_source=True returns (tracks, source) with source 'memo', 'cache', 'network' or 'db-fallback'.
+        """
+        max_age = self.cache_max_age if max_age is None else max_age
+        tracks = self._track_memo.get(playlist_id, max_age) if max_age > 0 else None
+        if tracks is not None:
+            source = 'memo'
+        else:
+            tracks = self._fetch_cached_tracks(playlist_id, max_age) if max_age > 0 else None
+            if tracks is not None:
+                source = 'cache'
+            else:
+                tracks, source = self._fetch_network_tracks(playlist_id)
+            if source != 'db-fallback':
+                self._track_memo.put(playlist_id, tracks)
+        logger.debug(f"Tracks for {playlist_id}: {len(tracks)} from {source}")
+        return (tracks, source) if with_source else tracks
+
+    def _fetch_network_tracks(self, playlist_id):
         """Fetches all tracks from a playlist using YouTube Data API. Fallbacks to DB."""
         
         # PRIORITIZE INTERNAL API (Cookie Auth)
@@ -285,14 +485,15 @@ class PlaylistManager:
                 return self._fetch_internal_tracks_logic(playlist_id)
             
             print(f" [WARN] Data API Error: {e}. Falling back to DB.")
-            return self._fetch_db_tracks(playlist_id)
+            return self._fetch_db_tracks(playlist_id), 'db-fallback'
             
-        return tracks
+        return tracks, 'network'
 
     def deduplicate_playlist(self, playlist_id):
         """Removes duplicate songs from a playlist."""
         print(f"Scanning playlist {playlist_id} for duplicates...")
-        tracks = self.get_playlist_tracks(playlist_id)
+        # Live read: the local copy keeps one row per video, so it can't show exact duplicates
+        tracks = self.get_playlist_tracks(playlist_id, max_age=0)
         
         seen_ids = set()
         seen_signatures = set()
@@ -323,7 +524,7 @@ class PlaylistManager:
         print(f"Found {len(duplicates)} duplicates. Removing...")
         items_to_remove = []
         for track in duplicates:
-            if 'setVideoId' in track:
+            if track.get('setVideoId'):
                 items_to_remove.append(track)
             else:
                 print(f"Warning: Could not find setVideoId for duplicate {track.get('title')}")
@@ -331,17 +532,14 @@ class PlaylistManager:
         if items_to_remove:
             try:
                 self.yt.remove_playlist_items(playlist_id, items_to_remove)
+                self._touched(playlist_id)
                 print(f"Successfully removed {len(items_to_remove)} duplicates.")
                 
                 # Update Local DB
                 try:
                     from db_manager import DBManager
                     db = DBManager(self.db_path)
-                    for track in items_to_remove:
-                        svid = track.get('setVideoId')
-                        if svid:
-                            db.cursor.execute("DELETE FROM playlist_tracks WHERE set_video_id = ?", (svid,))
-                    db.commit()
+                    db.remove_playlist_items([t['setVideoId'] for t in items_to_remove if t.get('setVideoId')])
                     db.close()
                 except Exception as e:
                     print(f"Error updating DB after deduplication: {e}")
@@ -351,12 +549,55 @@ class PlaylistManager:
         else:
             print("Could not remove duplicates (missing setVideoId).")
 
+    def _touched(self, playlist_id=None):
+        """
+        Called on every write: the playlist's memoized tracks and the memoized listing
+        (counts, covers, new playlists) are stale. Listing signatures of untouched
+        playlists stay usable for freshness checks; touched ones are in _dirty.
+        """
+        if playlist_id:
+            self._dirty.add(playlist_id)
+            self._track_memo.discard(playlist_id)
+        self._playlists = None
+
     def create_playlist(self, title, description=""):
-        return self.yt.create_playlist(title, description)
+        self.limiter.acquire()
+        try:
+            return self.yt.create_playlist(title, description)
+        finally:
+            self._touched()
 
     def add_tracks(self, playlist_id, video_ids):
+        self._touched(playlist_id)
         return self.yt.add_playlist_items(playlist_id, video_ids)
 
+    def _build_artist_routes(self, target_playlist_ids):
+        """
+        Returns {normalized artist name: playlist_id} for the target playlists.
+        Scanned playlists come from the DB artist index in one query; playlists
+        the DB doesn't know yet (or that we changed this run) are read over the API.
+        """
+        routes = {}
+        remaining = list(target_playlist_ids)
+        try:
+            db = self._get_cache_db()
+            scanned = db.get_scanned_playlist_ids()
+            indexed = [pid for pid in target_playlist_ids if pid in scanned and pid not in self._dirty]
+            routes = db.get_artist_routes(indexed)
+            remaining = [pid for pid in target_playlist_ids if pid not in indexed]
+        except Exception as e:
+            logger.debug(f"Artist index unavailable, reading playlists instead: {e}")
+
+        for pid in remaining:
+            try:
+                for track in self.get_playlist_tracks(pid):
+                    for artist in track.get('artists', []):
+                        for key in split_artists(artist.get('name')):
+                            routes.setdefault(key, pid)
+            except Exception as e:
+                print(f"Error reading playlist {pid}: {e}")
+        return routes
+
     def smart_organize(self, source_playlist_id, target_playlist_ids):
         """
         Moves tracks from source playlist to target playlists based on artist matching.
@@ -364,22 +605,9 @@ class PlaylistManager:
         """
         print(f"Starting Smart Organization from {source_playlist_id}...")
         
-        # 1. Build Artist Map from Target Playlists
-        artist_map = {} # Artist Name -> Playlist ID
+        # 1. Build Artist Map from Target Playlists (local artist index, no API calls)
         print("Building artist map from target playlists...")
-        for pid in target_playlist_ids:
-            try:
-                tracks = self.get_playlist_tracks(pid)
-                for track in tracks:
-                    artists = track.get('artists', [])
-                    if artists:
-                        # Map primary artist
-                        primary_artist = artists[0]['name'].lower()
-                        artist_map[primary_artist] = pid
-                        # Also map all artists? Maybe just primary for safety.
-            except Exception as e:
-                print(f"Error reading playlist {pid}: {e}")
-
+        artist_map = self._build_artist_routes(target_playlist_ids) # Normalized artist -> Playlist ID
         print(f"Mapped {len(artist_map)} artists.")
 
         # 2. Scan Source Playlist
@@ -392,8 +620,15 @@ class PlaylistManager:
             if not artists:
                 continue
                 
-            primary_artist = artists[0]['name'].lower()
-            target_pid = artist_map.get(primary_artist)
+            # Try every credited artist (primary first), including "feat." guests
+            target_pid = None
+            for artist in artists:
+                for key in split_artists(artist.get('name')):
+                    target_pid = artist_map.get(key)
+                    if target_pid:
+                        break
+                if target_pid:
+                    break
             
             if target_pid:
                 # Check if it's already in target? 
@@ -403,10 +638,10 @@ class PlaylistManager:
                 
                 moves[target_pid].append(track['videoId'])
                 
-                if 'setVideoId' in track:
+                if track.get('setVideoId'):
                     removals.append(track) # Store full track object for removal
                 
-                print(f"Match: {primary_artist} -> {target_pid} ({track['title']})")
+                print(f"Match: {artist['name']} -> {target_pid} ({track['title']})")
 
         # 3. Execute Moves
         if not moves:
@@ -419,6 +654,7 @@ class PlaylistManager:
         for pid, video_ids in moves.items():
             print(f"Adding {len(video_ids)} tracks to {pid}...")
             try:
+                self._touched(pid)
                 self.yt.add_playlist_items(pid, video_ids)
             except Exception as e:
                 print(f"Failed to add to {pid}: {e}")
@@ -427,67 +663,106 @@ class PlaylistManager:
         if removals:
             print(f"Removing {len(removals)} tracks from source...")
             try:
+                self._touched(source_playlist_id)
                 self.yt.remove_playlist_items(source_playlist_id, removals)
             except Exception as e:
                 print(f"Failed to remove from source: {e}")
 
     # create_playlist_v3 removed: Replaced by self.yt.create_playlist (Internal API)
 
-    def add_items_internal_robust(self, playlist_id, video_ids, batch_size=50):
-        """
-        Adds tracks using the Internal API (Quota-Free).
-        Strategy:
-        1. Try adding in batches.
-        2. If a batch fails (HTTP 400), retry items individually to isolate bad tracks.
-        """
-        import time
-        
-    def add_items_internal_robust(self, playlist_id, video_ids, batch_size=50):
+    def _add_batch(self, playlist_id, batch):
+        """One add_playlist_items call. Raises unless the API reports SUCCEEDED."""
+        self.limiter.acquire()
+        resp = self.yt.add_playlist_items(playlist_id, batch)
+        status = resp.get('status') if isinstance(resp, dict) else resp
+        if 'SUCCEEDED' not in str(status):
+            raise ValueError(f"Batch rejected: {status or resp}")
+        return resp
+
+    def add_items_internal_robust(self, playlist_id, video_ids, batch_size=None, max_throttle_retries=5, on_progress=None):
         """
-        Adds tracks using the Internal API (Quota-Free).
+        Adds tracks using the Internal API (Quota-Free), in order.
         Strategy:
-        1. Try adding in batches.
-        2. If a batch fails (HTTP 400), retry items individually to isolate bad tracks.
+        1. Send batches sized by self.batch_tuner (grows while calls are fast, shrinks on slow/throttled calls),
+           never larger than batch_size when given (the shared tuner itself is left alone).
+        2. Throttled batches (429/5xx) and other transient errors are retried after a growing delay;
+           after max_throttle_retries in a row a RuntimeError is raised (nothing is marked skipped).
+        3. Rejected batches (other 4xx, non-SUCCEEDED status) are bisected until the bad ids are isolated,
+           so one bad track costs ~2*log2(batch) extra calls instead of one per item.
+        Tracks are handled strictly in order, so after on_progress(report) the first
+        report['added'] + len(report['skipped']) ids are done (used for restore checkpoints).
+        Returns {'added': int, 'skipped': [{'videoId', 'error'}], 'requests': int}.
         """
         import time
-        
-        total = len(video_ids)
-        # print(f"Adding {total} tracks via Internal API (Quota-Free)...")
-        
-        for i in range(0, total, batch_size):
-            batch = video_ids[i:i+batch_size]
-            current_batch_num = (i // batch_size) + 1
-            total_batches = (total + batch_size - 1) // batch_size
-            
-            # print(f"Processing batch {current_batch_num}/{total_batches} ({len(batch)} songs)...")
-            
+
+        tuner = self.batch_tuner
+        report = {'added': 0, 'skipped': [], 'requests': 0}
+        self._touched(playlist_id)
+
+        # Stack of pending slices; left halves are pushed last so playlist order is kept
+        stack = [list(video_ids)]
+        throttle_retries = 0
+        backed_off = False
+        while stack:
+            batch = stack.pop()
+            if not batch:
+                continue
+            size = min(tuner.size, batch_size) if batch_size else tuner.size
+            if len(batch) > size:
+                stack.append(batch[size:])
+                batch = batch[:size]
+
+            if not backed_off: # After a throttle the limiter pause already was the wait
+                time.sleep(tuner.delay)
+            backed_off = False
+            start = time.monotonic()
+            report['requests'] += 1
             try:
-                # Try adding the whole batch
-                resp = self.yt.add_playlist_items(playlist_id, batch)
+                resp = self._add_batch(playlist_id, batch)
                 logger.debug(f"Batch response: {resp}")
             except Exception as e:
-                # If batch fails, fallback to individual
-                logger.debug(f"Batch failed ({e}). Retrying individually...")
-                for vid in batch:
-                    try:
-                        self.yt.add_playlist_items(playlist_id, [vid])
-                    except Exception as inner_e:
-                        logger.debug(f"Skipping bad track {vid}: {inner_e}")
-                logger.debug(f"Recovered from batch error.")
-            
-            # Small sleep to be nice to the server
-            time.sleep(0.5)
-            
-        # print("Done adding tracks.")
+                status = http_status(e)
+                rejected = isinstance(e, ValueError) or (status is not None and 400 <= status < 500 and not is_throttled(e))
+                if not rejected:
+                    # Says nothing about the ids: retry the same batch, never skip tracks for it
+                    if throttle_retries >= max_throttle_retries:
+                        raise RuntimeError(f"Still throttled after {throttle_retries} retries "
+                                           f"({report['added']} of {len(video_ids)} added): {e}") from e
+                    throttle_retries += 1
+                    tuner.throttled(retry_after(e, default=0))
+                    self.limiter.pause(tuner.delay)
+                    backed_off = True
+                    logger.debug(f"Throttled ({e}). Retrying in {tuner.delay:.1f}s with batches of {tuner.size}.")
+                    stack.append(batch)
+                elif len(batch) == 1:
+                    logger.debug(f"Skipping bad track {batch[0]}: {e}")
+                    report['skipped'].append({'videoId': batch[0], 'error': str(e)})
+                    if on_progress:
+                        on_progress(report)
+                else:
+                    mid = len(batch) // 2
+                    logger.debug(f"Batch of {len(batch)} failed ({e}). Bisecting...")
+                    stack.append(batch[mid:])
+                    stack.append(batch[:mid])
+                continue
 
+            throttle_retries = 0
+            tuner.success(time.monotonic() - start)
+            report['added'] += len(batch)
+            if on_progress:
+                on_progress(report)
 
+        return report
 
     def sort_standard(self, playlist_id, title_hint=None, create_copy=True):
         """
         Sorts a playlist by Artist -> Title.
-        If create_copy is True, creates a new playlist "[Sorted] Original Name".
+        If create_copy is True, creates a new playlist "[Sorted] Original Name",
+        otherwise reorders the playlist itself (see sort_in_place).
         """
         # print(f"Sorting playlist {playlist_id}...")
+        if not create_copy:
+            return self.sort_in_place(playlist_id)
         
         # Use Data API method (reliable) instead of internal API (fragile for some users)
         tracks = self.get_playlist_tracks(playlist_id)
@@ -503,43 +778,139 @@ class PlaylistManager:
                 title = f"Playlist_{playlist_id}"
 
         
-        # Sort logic
-        # Key: Artist (lowercase) -> Title (lowercase)
-        def sort_key(track):
-            artist_list = track.get('artists', [])
-            artist = artist_list[0]['name'].lower() if artist_list else ""
-            title = track.get('title', '').lower()
-            return (artist, title)
-
         sorted_tracks = sorted(tracks, key=sort_key)
         sorted_video_ids = [t['videoId'] for t in sorted_tracks if t.get('videoId')]
         
         # logger.info(f"Preparing to add {len(sorted_video_ids)} tracks to sorted playlist.")
 
-        if create_copy:
-            new_title = f"{title} [Sorted]"
-            try:
-                # print(f"Creating new playlist: {new_title}")
-                pass
-            except UnicodeEncodeError:
-                # print(f"Creating new playlist: {new_title.encode('ascii', 'ignore').decode('ascii')}")
-                pass
+        new_title = f"{title} [Sorted]"
+        try:
+            # print(f"Creating new playlist: {new_title}")
+            pass
+        except UnicodeEncodeError:
+            # print(f"Creating new playlist: {new_title.encode('ascii', 'ignore').decode('ascii')}")
+            pass
+        
+        try:
+            new_pid = self.create_playlist(new_title, f"Sorted version of {title}")
+            # print(f"Success! Created {new_title} ({new_pid})")
             
-            try:
-                new_pid = self.yt.create_playlist(new_title, f"Sorted version of {title}")
-                # print(f"Success! Created {new_title} ({new_pid})")
-                
-                # Internal API for adding items
-                self.add_items_internal_robust(new_pid, sorted_video_ids)
-                
+            # Internal API for adding items
+            report = self.add_items_internal_robust(new_pid, sorted_video_ids)
+            if report['skipped']:
+                print(f"Skipped {len(report['skipped'])} unavailable tracks: {', '.join(s['videoId'] for s in report['skipped'])}")
+            
+            return new_pid
+        except Exception as e:
+            print(f"Failed to create/populate playlist: {e}")
 
-                
-                return new_pid
+    def sort_in_place(self, playlist_id):
+        """
+        Sorts a playlist by Artist -> Title without copying it.
+        Tracks on the longest increasing subsequence (already in relative order) stay put;
+        every other track is moved once with edit_playlist(moveItem=...), so a nearly
+        sorted playlist costs only a few calls. Returns the number of moves; raises
+        RuntimeError if a move is rejected (the playlist is left partially sorted).
+        """
+        # Moves need the real setVideoIds, so always read the live playlist
+        tracks = [t for t in self.get_playlist_tracks(playlist_id, max_age=0) if t.get('setVideoId')]
+        target = sorted(tracks, key=sort_key) # Stable
+        plan = plan_moves([t['setVideoId'] for t in tracks], [t['setVideoId'] for t in target])
+        if not plan:
+            logger.debug(f"{playlist_id} already sorted.")
+            return 0
+
+        moves = 0
+        self._touched(playlist_id)
+        for set_video_id, successor in plan:
+            move = (set_video_id, successor) if successor else set_video_id # str = move to end
+            while True:
+                try:
+                    self.limiter.acquire() # Pacing comes from the shared bucket only
+                    resp = self.yt.edit_playlist(playlist_id, moveItem=move)
+                except Exception as e:
+                    if not is_throttled(e):
+                        raise RuntimeError(f"Move failed after {moves} of {len(plan)} moves: {e}")
+                    self.batch_tuner.throttled(retry_after(e, default=0))
+                    self.limiter.pause(self.batch_tuner.delay)
+                    continue
+                # ytmusicapi reports a rejected edit as 'STATUS_FAILED' instead of raising
+                status = resp.get('status') if isinstance(resp, dict) else resp
+                if 'SUCCEEDED' not in str(status):
+                    raise RuntimeError(f"Move failed after {moves} of {len(plan)} moves: {status or resp}")
+                break
+            moves += 1
+
+        # Keep the local library's positions in step so the read-through cache stays valid
+        try:
+            from db_manager import DBManager
+            if playlist_id in self._get_cache_db().get_playlist_scan_state():
+                db = DBManager(self.db_path)
+                try:
+                    db.sync_playlist_tracks(playlist_id, target)
+                finally:
+                    db.close()
+        except Exception as e:
+            logger.debug(f"Could not update stored positions for {playlist_id}: {e}")
+
+        logger.debug(f"Sorted {playlist_id} in place: {moves} moves for {len(target)} tracks.")
+        return moves
+
+    def is_sorted_locally(self, playlist_id):
+        """
+        True/False when the local DB holds a fresh copy of the playlist (same rules as the
+        read-through cache), None when only the network could tell. No API calls.
+        """
+        tracks = self._fetch_cached_tracks(playlist_id, self.cache_max_age)
+        if tracks is None:
+            return None
+        keys = [sort_key(t) for t in tracks]
+        return all(a <= b for a, b in zip(keys, keys[1:]))
+
+    def sort_many(self, playlists, create_copy=True, workers=4, on_done=None):
+        """
+        Sorts several playlists concurrently. Every worker draws from self.limiter,
+        so concurrency only fills the idle time between requests, it doesn't raise the rate.
+        Playlists the local DB shows as already sorted are skipped without network calls.
+        playlists: listing dicts ('playlistId', 'title'); on_done(result) runs in the calling thread.
+        Returns one {'title', 'playlistId', 'status', 'detail', 'seconds'} per playlist, in input order.
+        """
+        import time
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        def sort_one(p):
+            start = time.monotonic()
+            result = {'title': p['title'], 'playlistId': p['playlistId'], 'status': 'sorted', 'detail': ''}
+            try:
+                if self.is_sorted_locally(p['playlistId']):
+                    result['status'] = 'already sorted'
+                elif create_copy:
+                    new_pid = self.sort_standard(p['playlistId'], title_hint=p['title'])
+                    if new_pid:
+                        result['detail'] = f"copy {new_pid}"
+                    else:
+                        result['status'] = 'failed'
+                else:
+                    moves = self.sort_in_place(p['playlistId'])
+                    if moves:
+                        result['detail'] = f"{moves} moves"
+                    else:
+                        result['status'] = 'already sorted'
             except Exception as e:
-                print(f"Failed to create/populate playlist: {e}")
-        else:
-            # In-place sort (Dangerous / Slow)
-            print("In-place sort not fully implemented for safety. Please use create_copy=True.")
+                result['status'] = 'failed'
+                result['detail'] = str(e)
+            result['seconds'] = time.monotonic() - start
+            return result
+
+        results = [None] * len(playlists)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            future_to_idx = {executor.submit(sort_one, p): idx for idx, p in enumerate(playlists)}
+            for future in as_completed(future_to_idx):
+                idx = future_to_idx[future]
+                results[idx] = future.result()
+                if on_done:
+                    on_done(results[idx])
+        return results
 
 if __name__ == "__main__":
     pm = PlaylistManager()
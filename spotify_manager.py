@@ -1,113 +1,327 @@
 import spotipy
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from spotipy.oauth2 import SpotifyOAuth
+from spotipy.exceptions import SpotifyException
+from rate_limiter import TokenBucket, retry_after
+from ordering import plan_moves
+import matcher
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import time
 
+def _retrying_session(retries=3):
+    """
+    A requests session like spotipy's own, except that urllib3 never retries a 429:
+    spotipy's Retry honours Retry-After whatever status_forcelist says, which would make
+    each worker sleep through its own 429s instead of reporting them to the shared limiter.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=Retry(
+        total=retries,
+        connect=None,
+        read=False,
+        status=retries,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status_forcelist=(500, 502, 503, 504),
+        backoff_factor=0.3,
+        respect_retry_after_header=False
+    ))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
 class SpotifyManager:
-    def __init__(self, client_id, client_secret, redirect_uri="http://127.0.0.1:8888/callback"):
+    def __init__(self, client_id, client_secret, redirect_uri="http://127.0.0.1:8888/callback",
+                 requests_per_second=10, max_retries=5, db=None, index_max_age=86400, page_workers=4):
+        # Every 429 reaches _call (see _retrying_session), so one Retry-After pauses every
+        # worker through the shared limiter below; spotipy still retries 5xx errors itself.
         self.sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
             client_id=client_id,
             client_secret=client_secret,
             redirect_uri=redirect_uri,
             scope="playlist-modify-public playlist-modify-private",
             open_browser=True
-        ))
-        self.user_id = self.sp.current_user()['id']
+        ), requests_session=_retrying_session())
+        self.limiter = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.page_workers = page_workers
+        self.user_id = self._call(self.sp.current_user)['id']
         print(f"Connected to Spotify as: {self.user_id}")
 
+        # name -> playlist id for playlists this account owns. Loaded once (from the DB
+        # while it is younger than index_max_age seconds, else from the API) and updated
+        # locally on create, so lookups never page through the whole library.
+        self.db = db
+        self.index_max_age = index_max_age
+        self._playlist_index = None
+
+    def _call(self, fn, *args, **kwargs):
+        """Runs a Spotify API call through the shared rate limiter, honouring Retry-After on 429."""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except SpotifyException as e:
+                if e.http_status != 429 or attempt == self.max_retries:
+                    raise
+                self.limiter.pause(retry_after(e))
+
+    def _paginate(self, fetch, page_size, **kwargs):
+        """
+        Yields the items of a paged endpoint in order. The first page gives `total`, the
+        remaining offsets are fetched concurrently (at most page_workers in flight, all
+        through the shared limiter) and streamed out page by page.
+        """
+        first = self._call(fetch, limit=page_size, offset=0, **kwargs)
+        yield from first['items']
+        offsets = iter(range(page_size, first.get('total') or 0, page_size))
+        if self.page_workers <= 1:
+            for offset in offsets:
+                yield from self._call(fetch, limit=page_size, offset=offset, **kwargs)['items']
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.page_workers)
+        try:
+            pending = deque()
+            for offset in offsets:
+                pending.append(executor.submit(self._call, fetch, limit=page_size, offset=offset, **kwargs))
+                if len(pending) >= self.page_workers * 2: # Bound read-ahead (memory)
+                    yield from pending.popleft().result()['items']
+            while pending:
+                yield from pending.popleft().result()['items']
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
     def get_user_playlists(self):
-        playlists = []
-        results = self.sp.current_user_playlists(limit=50)
-        playlists.extend(results['items'])
-        while results['next']:
-            results = self.sp.next(results)
-            playlists.extend(results['items'])
-        return [{'name': p['name'], 'id': p['id']} for p in playlists]
+        playlists = [
+            {'name': p['name'], 'id': p['id'], 'snapshot_id': p.get('snapshot_id'),
+             'owner': (p.get('owner') or {}).get('id')}
+            for p in self._paginate(self.sp.current_user_playlists, 50) if p
+        ]
+        # A full listing is free to index, so keep the cache in step
+        self._store_index([p for p in playlists if p['owner'] == self.user_id])
+        return playlists
 
-    def get_playlist_tracks(self, playlist_id):
-        """Returns list of dicts: {'artist': ..., 'title': ..., 'uri': ...}"""
-        tracks = []
-        results = self.sp.playlist_items(playlist_id, additional_types=['track'])
-        items = results['items']
-        while results['next']:
-            results = self.sp.next(results)
-            items.extend(results['items'])
-            
+    def _store_index(self, owned):
+        index = {}
+        for p in owned:
+            index.setdefault(p['name'], p['id']) # First listed wins on duplicate names
+        self._playlist_index = index
+        if self.db:
+            self.db.replace_spotify_playlists(self.user_id, owned)
+
+    def _load_index(self, refresh=False):
+        if self._playlist_index is not None and not refresh:
+            return self._playlist_index
+        if self.db and not refresh:
+            stored, refreshed_at = self.db.get_spotify_playlists(self.user_id)
+            if refreshed_at and time.time() - refreshed_at < self.index_max_age:
+                self._playlist_index = {}
+                for p in stored:
+                    self._playlist_index.setdefault(p['name'], p['id'])
+                return self._playlist_index
+        self.get_user_playlists() # Rebuilds and persists the index
+        return self._playlist_index
+
+    def find_playlist(self, name, refresh=False):
+        """Id of the owned playlist called `name`, or None."""
+        return self._load_index(refresh).get(name)
+
+    def iter_playlist_tracks(self, playlist_id):
+        """Streams {'artist', 'title', 'uri', 'duration', 'isrc'} per track (local files skipped)."""
+        items = self._paginate(
+            self.sp.playlist_items, 100, playlist_id=playlist_id, additional_types=['track'],
+            fields='total,items(track(name,uri,is_local,duration_ms,external_ids(isrc),artists(name)))'
+        )
         for item in items:
             track = item.get('track')
             if not track or track.get('is_local'): continue
             
             artists = ", ".join([a['name'] for a in track['artists']])
-            tracks.append({
+            yield {
                 'artist': artists,
                 'title': track['name'],
-                'uri': track['uri']
-            })
-        return tracks
+                'uri': track['uri'],
+                'duration': (track.get('duration_ms') or 0) / 1000 or None,
+                'isrc': (track.get('external_ids') or {}).get('isrc')
+            }
+
+    def get_playlist_tracks(self, playlist_id):
+        """Returns list of dicts: {'artist', 'title', 'uri', 'duration', 'isrc'}"""
+        return list(self.iter_playlist_tracks(playlist_id))
+
+    def get_playlist_snapshot(self, playlist_id):
+        """Current snapshot_id of a playlist (one small metadata request)."""
+        return self._call(self.sp.playlist, playlist_id, fields='snapshot_id')['snapshot_id']
+
+    def get_playlist_uris(self, playlist_id):
+        """Every item URI in playlist order, local files included (positions must line up for edits)."""
+        items = self._paginate(
+            self.sp.playlist_items, 100, playlist_id=playlist_id, additional_types=['track'],
+            fields='total,items(track(uri))'
+        )
+        return [item['track']['uri'] for item in items if item.get('track')]
+
+    def mirror_playlist(self, playlist_id, desired_uris, current_uris):
+        """
+        Makes the playlist hold exactly desired_uris (unique, in order), with few writes:
+        1. removes unwanted URIs (and every copy of a duplicated one),
+        2. moves the rest into order; items on the longest increasing subsequence stay put,
+        3. inserts each run of missing URIs straight at its final position.
+        Falls back to a full replace when that takes fewer requests (e.g. a reversed playlist).
+        current_uris: the playlist's present contents, in order.
+        Returns {'added', 'removed', 'moved', 'replaced', 'snapshot_id'}; snapshot_id is None when nothing changed.
+        Errors propagate, so a partial mirror is never recorded as done.
+        """
+        desired_set = set(desired_uris)
+        counts = {}
+        for uri in current_uris:
+            counts[uri] = counts.get(uri, 0) + 1
+        to_remove = [uri for uri, n in counts.items() if uri not in desired_set or n > 1]
+        removed = set(to_remove)
+        current = [uri for uri in current_uris if uri not in removed]
+        present = set(current)
+        moves = plan_moves(current, [uri for uri in desired_uris if uri in present])
+        runs = [] # (start, end) slices of desired_uris to insert, at most 100 each
+        i = 0
+        while i < len(desired_uris):
+            if desired_uris[i] in present:
+                i += 1
+                continue
+            end = i
+            while end < len(desired_uris) and desired_uris[end] not in present and end - i < 100:
+                end += 1
+            runs.append((i, end))
+            i = end
+
+        stats = {
+            'added': sum(end - start for start, end in runs),
+            'removed': sum(counts[uri] for uri in to_remove),
+            'moved': len(moves), 'replaced': False, 'snapshot_id': None
+        }
+        edit_calls = (len(to_remove) + 99) // 100 + len(moves) + len(runs)
+        if edit_calls > max(1, (len(desired_uris) + 99) // 100):
+            stats['moved'] = 0
+            stats['replaced'] = True
+            stats['snapshot_id'] = self.replace_tracks_in_playlist(playlist_id, desired_uris)
+            return stats
+
+        for i in range(0, len(to_remove), 100):
+            resp = self._call(self.sp.playlist_remove_all_occurrences_of_items, playlist_id, to_remove[i:i+100])
+            stats['snapshot_id'] = resp.get('snapshot_id')
+
+        # Spotify moves are index based, so track the list locally as it changes
+        for uri, successor in moves:
+            start = current.index(uri)
+            before = current.index(successor) if successor else len(current)
+            resp = self._call(self.sp.playlist_reorder_items, playlist_id, range_start=start, insert_before=before)
+            stats['snapshot_id'] = resp.get('snapshot_id')
+            current.pop(start)
+            current.insert(before - 1 if start < before else before, uri)
+
+        # Everything before a run's start is already final, so it goes straight to its position
+        for start, end in runs:
+            resp = self._call(self.sp.playlist_add_items, playlist_id, desired_uris[start:end], position=start)
+            stats['snapshot_id'] = resp.get('snapshot_id')
+        return stats
 
     def create_playlist(self, name, description="Synced from YouTube Music"):
         # Check if exists first
-        current_playlists = self.get_user_playlists()
-        if name in current_playlists:
+        existing = self.find_playlist(name)
+        if existing:
             try:
                 print(f"Playlist '{name}' already exists on Spotify.")
             except UnicodeEncodeError:
                 print(f"Playlist '{name.encode('ascii', 'ignore').decode('ascii')}' already exists on Spotify.")
-            return current_playlists[name]
+            return existing
         
         try:
             print(f"Creating Spotify playlist: {name}")
         except UnicodeEncodeError:
             print(f"Creating Spotify playlist: {name.encode('ascii', 'ignore').decode('ascii')}")
-        playlist = self.sp.user_playlist_create(self.user_id, name, public=False, description=description)
+        playlist = self._call(self.sp.user_playlist_create, self.user_id, name, public=False, description=description)
+        self._playlist_index[name] = playlist['id']
+        if self.db:
+            self.db.save_spotify_playlist(self.user_id, playlist['id'], name, playlist.get('snapshot_id'))
         return playlist['id']
 
-    def search_track(self, artist, title):
-        # Clean title (remove [Official Video], etc)
-        clean_title = title.split('(')[0].split('[')[0].strip()
-        query = f"artist:{artist} track:{clean_title}"
+    def _search_candidates(self, query, limit):
+        results = self._call(self.sp.search, q=query, type='track', limit=limit)
+        return [
+            {'uri': item['uri'], 'title': item['name'], 'artists': [a['name'] for a in item['artists']],
+             'duration': (item.get('duration_ms') or 0) / 1000 or None,
+             'isrc': (item.get('external_ids') or {}).get('isrc')}
+            for item in results['tracks']['items'] if item
+        ]
+
+    def lookup_isrc(self, isrc):
+        """Exact lookup by ISRC. Returns a candidate dict ('uri', 'title', ...) or None."""
+        candidates = self._search_candidates(f"isrc:{isrc}", limit=1)
+        return candidates[0] if candidates else None
+
+    def match_track(self, artists, title, duration=None):
+        """
+        Finds the Spotify track for a source track (artists: list of names, duration in seconds).
+        Scores several candidates from a field search; only low-confidence results
+        trigger a second, broader free-text search.
+        Returns (candidate, confidence); candidate ('uri', 'title', 'artists', 'duration', 'isrc')
+        is None below matcher.MIN_CONFIDENCE.
+        """
+        source = {'title': title, 'artists': artists, 'duration': matcher.parse_duration(duration)}
+        primary = matcher.strip_featuring(artists[0]).split(',')[0].strip() if artists else ''
+        short_title = matcher.search_title(title)
         
-        try:
-            results = self.sp.search(q=query, type='track', limit=1)
-            items = results['tracks']['items']
-            if items:
-                return items[0]['uri']
-            
-            # Retry with just title if artist + title fails (looser search)
-            # query = f"track:{clean_title} artist:{artist}"
-            # results = self.sp.search(q=query, type='track', limit=1)
-            # items = results['tracks']['items']
-            # if items:
-            #     return items[0]['uri']
+        candidates = self._search_candidates(f"artist:{primary} track:{short_title}", limit=5)
+        best, confidence = matcher.best_match(source, candidates)
+        if confidence < matcher.ACCEPT_CONFIDENCE:
+            # Broader query: no field filters, full title (alternate titles often match here)
+            seen = {c['uri'] for c in candidates}
+            broader = [c for c in self._search_candidates(f"{primary} {matcher.clean_title(title)}", limit=10) if c['uri'] not in seen]
+            other, other_confidence = matcher.best_match(source, broader)
+            if other_confidence > confidence:
+                best, confidence = other, other_confidence
                 
+        if not best or confidence < matcher.MIN_CONFIDENCE:
+            return None, confidence
+        return best, confidence
+
+    def search_track(self, artist, title, duration=None):
+        """Returns the URI of the best match above matcher.MIN_CONFIDENCE, or None."""
+        try:
+            best, _ = self.match_track([artist], title, duration)
+            return best['uri'] if best else None
+        except SpotifyException as e:
+            if e.http_status == 429:
+                raise # Still rate limited after retries: let the caller decide, don't report a miss
+            print(f"Error searching {artist} - {title}: {e}")
         except Exception as e:
             print(f"Error searching {artist} - {title}: {e}")
             
         return None
 
     def add_tracks_to_playlist(self, playlist_id, track_uris):
+        """Appends in batches. Returns the final snapshot_id, or None if any batch failed."""
+        snapshot_id = None
+        failed = False
         # Spotify allows max 100 tracks per request
         for i in range(0, len(track_uris), 100):
             batch = track_uris[i:i+100]
             try:
-                self.sp.playlist_add_items(playlist_id, batch)
+                snapshot_id = self._call(self.sp.playlist_add_items, playlist_id, batch).get('snapshot_id')
                 time.sleep(0.5)
             except Exception as e:
                 print(f"Error adding tracks: {e}")
+                failed = True
+        return None if failed else snapshot_id
 
     def replace_tracks_in_playlist(self, playlist_id, track_uris):
-        # First batch uses 'replace' to clear and set (max 100)
-        if not track_uris:
-            self.sp.playlist_replace_items(playlist_id, [])
-            return
-
-        first_batch = track_uris[:100]
-        try:
-            self.sp.playlist_replace_items(playlist_id, first_batch)
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"Error replacing tracks: {e}")
-            return
-
-        # Subsequent batches use 'add'
-        if len(track_uris) > 100:
-            self.add_tracks_to_playlist(playlist_id, track_uris[100:])
+        """
+        Overwrites the playlist with track_uris (first 100 replace, the rest are appended).
+        Returns the final snapshot_id; errors propagate.
+        """
+        resp = self._call(self.sp.playlist_replace_items, playlist_id, track_uris[:100])
+        for i in range(100, len(track_uris), 100):
+            resp = self._call(self.sp.playlist_add_items, playlist_id, track_uris[i:i+100])
+        return resp.get('snapshot_id')
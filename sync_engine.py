@@ -1,8 +1,14 @@
 from spotify_manager import SpotifyManager
-from sorter import PlaylistManager
+from sorter import PlaylistManager, playlist_fingerprint
+from db_manager import DBManager
+import matcher
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import json
 
+# Marks a lookup that failed (network error, rate limit) rather than a real miss
+MATCH_ERROR = object()
+
 def load_config():
     with open('config.json', 'r') as f:
         return json.load(f)
@@ -11,15 +17,26 @@ class SyncEngine:
     def __init__(self):
         self.config = load_config()
         self.sp_config = self.config['spotify']
+        self.sync_config = self.config.get('sync', {})
+        # Cached misses are retried after this many days (new releases, catalog changes)
+        self.miss_ttl = self.sync_config.get('miss_ttl_days', 7) * 86400
+        self.match_workers = self.sync_config.get('match_workers', 8)
         self.sp = None
         self.yt = None
+        self.db = None
         
     def connect(self):
+        if not self.db:
+            self.db = DBManager()
         if not self.sp:
             self.sp = SpotifyManager(
                 self.sp_config['client_id'], 
                 self.sp_config['client_secret'],
-                self.sp_config['redirect_uri']
+                self.sp_config['redirect_uri'],
+                requests_per_second=self.sync_config.get('spotify_requests_per_second', 10),
+                db=self.db,
+                index_max_age=self.sync_config.get('spotify_index_max_age_hours', 24) * 3600,
+                page_workers=self.sync_config.get('spotify_page_workers', 4)
             )
         if not self.yt:
             self.yt = PlaylistManager()
@@ -41,12 +58,83 @@ class SyncEngine:
         
         return yt_pl, sp_pl
 
-    def sync_to_spotify(self, yt_playlist_id, sp_playlist_name=None, smart=True, progress_callback=None):
+    def _match_parallel(self, items, match_fn, describe, progress_callback=None, done=0, total=None, verb="Matching"):
+        """
+        Runs match_fn over items on a bounded worker pool (rate limiting lives in the API wrappers).
+        Returns results in source order; lookups that raised come back as MATCH_ERROR.
+        progress_callback is still invoked from the calling thread as (current, total, message).
+        """
+        total = total if total is not None else len(items)
+        results = [None] * len(items)
+        if not items:
+            return results
+            
+        with ThreadPoolExecutor(max_workers=self.match_workers) as executor:
+            future_to_idx = {executor.submit(match_fn, item): idx for idx, item in enumerate(items)}
+            for n, future in enumerate(as_completed(future_to_idx)):
+                idx = future_to_idx[future]
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    print(f"Lookup failed for {describe(items[idx])}: {e}")
+                    results[idx] = MATCH_ERROR
+                    
+                if progress_callback and n % 5 == 0:
+                    progress_callback(done + n + 1, total, f"{verb}: {describe(items[idx])}")
+        return results
+
+    def _search_on_spotify(self, track):
+        """
+        Returns (uri or None, method, isrc). An exact ISRC lookup is tried first when the
+        track's ISRC is known; otherwise the fuzzy search, whose ISRC is learned when confident.
+        """
+        isrc = track.get('isrc')
+        if isrc:
+            found = self.sp.lookup_isrc(isrc)
+            if found:
+                return found['uri'], 'isrc', isrc
+        artists = [a['name'] for a in track.get('artists') or []] or ["Unknown"]
+        best, confidence = self.sp.match_track(artists, track['title'], track.get('duration'))
+        learned = best.get('isrc') if best and confidence >= matcher.ACCEPT_CONFIDENCE else None
+        return (best['uri'] if best else None), 'search', learned
+
+    def _youtube_candidates(self, query):
+        self.yt.limiter.acquire() # One YouTube budget, shared with the PlaylistManager's own calls
+        results = self.yt.yt.search(query, filter="songs", limit=5)
+        return [
+            {'videoId': r['videoId'], 'title': r.get('title'), 'artists': [a['name'] for a in r.get('artists') or []],
+             'duration': r.get('duration_seconds')}
+            for r in results if r.get('videoId')
+        ]
+
+    def _search_on_youtube(self, track):
+        """
+        Returns (video_id or None, method, isrc). YouTube Music indexes ISRCs, so the
+        ISRC is searched first and its hit kept if it scores as the same track; the ISRC
+        is returned (to be learned) for that hit and for a confident text match.
+        method 'guess' is YouTube's top result below matcher.MIN_CONFIDENCE: used, never cached.
+        """
+        source = {'title': track['title'], 'artists': [track['artist']], 'duration': track.get('duration')}
+        isrc = track.get('isrc')
+        if isrc:
+            best, confidence = matcher.best_match(source, self._youtube_candidates(isrc)[:3])
+            if best and confidence >= matcher.MIN_CONFIDENCE:
+                return best['videoId'], 'isrc', isrc
+        candidates = self._youtube_candidates(f"{track['artist']} {matcher.clean_title(track['title'])}")
+        best, confidence = matcher.best_match(source, candidates)
+        if not best or confidence < matcher.MIN_CONFIDENCE:
+            # Titles in another script score low; YouTube's own ranking is still the best guess
+            return (candidates[0]['videoId'] if candidates else None), 'guess', None
+        return best['videoId'], 'search', (isrc if confidence >= matcher.ACCEPT_CONFIDENCE else None)
+
+    def sync_to_spotify(self, yt_playlist_id, sp_playlist_name=None, smart=True, progress_callback=None, mirror=False):
+        """
+        Copies a YouTube playlist to Spotify.
+        smart: only append tracks the Spotify playlist doesn't have yet.
+        mirror: make the Spotify playlist match the YouTube one exactly (adds, removals and order).
+        """
         self.connect()
         
-        # Get Source Tracks
-        yt_tracks = self.yt.get_playlist_tracks(yt_playlist_id)
-        
         # Determine Target Name
         if not sp_playlist_name:
             try:
@@ -60,38 +148,138 @@ class SyncEngine:
             
         # Create/Get Target
         sp_playlist_id = self.sp.create_playlist(sp_playlist_name)
+
+        # Skip the pair when neither side changed since the last sync: the Spotify side is
+        # checked with one snapshot_id request, the YouTube side with the scan fingerprint
+        # (no track fetch) or, failing that, a fingerprint of the fetched tracks.
+        mode = 'mirror' if mirror else 'append' if smart else None
+        state = snapshot_id = None
+        if mode:
+            snapshot_id = self.sp.get_playlist_snapshot(sp_playlist_id)
+            state = self.db.get_sync_state(yt_playlist_id, sp_playlist_id)
+            if not state or state['mode'] != mode or state['snapshot_id'] != snapshot_id:
+                state = None # Spotify side changed (or never synced this way): stored URIs are stale
+        # Cached misses are searched again once they expire, so only skip within that window
+        can_skip = state and state['yt_fingerprint'] and time.time() - (state['synced_at'] or 0) < self.miss_ttl
+        if can_skip and self.yt.local_fingerprint(yt_playlist_id) == state['yt_fingerprint']:
+            return "Unchanged since last sync, skipped."
+
+        # Get Source Tracks
+        yt_tracks, source = self.yt.get_playlist_tracks(yt_playlist_id, with_source=True)
+        # 'db-fallback' means YouTube couldn't be read: possibly stale or empty, never mirrored
+        trusted = source in ('network', 'cache', 'memo')
+        yt_fingerprint = playlist_fingerprint(yt_tracks)
+        if can_skip and yt_fingerprint == state['yt_fingerprint']:
+            return "Unchanged since last sync, skipped."
         
         # Get Existing Target Tracks (for Smart Sync)
-        existing_uris = set()
-        if smart:
-            current_tracks = self.sp.get_playlist_tracks(sp_playlist_id)
-            existing_uris = {t['uri'] for t in current_tracks}
+        existing = []
+        if smart and not mirror:
+            existing = state['uris'] if state else self.sp.get_playlist_uris(sp_playlist_id)
+        existing_uris = set(existing)
             
-        # Match Tracks
+        # Match Tracks (consult the match cache first, only search new tracks)
         to_add = []
+        matched = [] # Every matched URI in source order (mirror mode)
+        failed = 0
         total = len(yt_tracks)
+        cached = self.db.get_track_matches('youtube', [t['videoId'] for t in yt_tracks if t.get('videoId')], self.miss_ttl)
+        pending = [t for t in yt_tracks if t.get('videoId') not in cached]
+        isrcs = self.db.get_track_isrcs(t['videoId'] for t in pending if t.get('videoId'))
+        pending = [dict(t, isrc=isrcs.get(t.get('videoId'))) for t in pending]
+        searched = iter(self._match_parallel(
+            pending, self._search_on_spotify, lambda t: t['title'],
+            progress_callback, done=total - len(pending), total=total
+        ))
+        new_matches = []
+        learned_isrcs = []
+        hits = misses = 0
         
-        for i, track in enumerate(yt_tracks):
+        for track in yt_tracks:
             artist = track['artists'][0]['name'] if track.get('artists') else "Unknown"
             title = track['title']
+            video_id = track.get('videoId')
             
-            if progress_callback and i % 5 == 0:
-                progress_callback(i+1, total, f"Matching: {title}")
-            
-            uri = self.sp.search_track(artist, title)
+            if video_id in cached:
+                hits += 1
+                uri = cached[video_id]
+            else:
+                misses += 1
+                result = next(searched)
+                if result is MATCH_ERROR:
+                    failed += 1
+                    continue # Not cached, retried next run
+                uri, method, isrc = result
+                if video_id:
+                    new_matches.append((video_id, uri, method))
+                    if isrc and method == 'search':
+                        learned_isrcs.append((video_id, isrc))
             if uri:
+                matched.append(uri)
                 if not smart or uri not in existing_uris:
                     to_add.append(uri)
             else:
                 print(f"Missing on Spotify: {artist} - {title}")
                 
+        if new_matches:
+            self.db.save_track_matches('youtube', new_matches)
+        if learned_isrcs:
+            self.db.set_track_isrcs(learned_isrcs)
+        by_isrc = sum(1 for m in new_matches if m[2] == 'isrc')
+        cache_info = f"(match cache: {hits} hits, {misses} misses, {by_isrc} by ISRC)"
+
+        # A run with failed lookups must not be trusted as "in sync" next time
+        if failed:
+            yt_fingerprint = None
+
+        if mirror:
+            if not failed and trusted:
+                result = self._mirror_to_spotify(yt_playlist_id, sp_playlist_id, matched, state, snapshot_id,
+                                                 yt_fingerprint, progress_callback)
+                return f"{result} {cache_info}"
+            # Can't tell what the source should be, so don't remove anything this run
+            if failed:
+                print(f"{failed} lookups failed; mirroring postponed, appending new tracks only.")
+            else:
+                print("YouTube playlist unavailable (local copy used); mirroring postponed, appending new tracks only.")
+            existing = state['uris'] if state else self.sp.get_playlist_uris(sp_playlist_id)
+            existing_uris = set(existing)
+            to_add = [uri for uri in dict.fromkeys(matched) if uri not in existing_uris]
+                
         # Execute
         if to_add:
             if progress_callback: progress_callback(total, total, f"Adding {len(to_add)} tracks...")
-            self.sp.add_tracks_to_playlist(sp_playlist_id, to_add)
-            return f"Added {len(to_add)} tracks."
+            new_snapshot = self.sp.add_tracks_to_playlist(sp_playlist_id, to_add)
+            if smart and not mirror and trusted and new_snapshot:
+                self.db.save_sync_state(yt_playlist_id, sp_playlist_id, new_snapshot,
+                                        existing + to_add, yt_fingerprint, mode='append')
+            return f"Added {len(to_add)} tracks. {cache_info}"
         else:
-            return "No new tracks to add."
+            if smart and not mirror and trusted:
+                self.db.save_sync_state(yt_playlist_id, sp_playlist_id, snapshot_id,
+                                        existing, yt_fingerprint, mode='append')
+            return f"No new tracks to add. {cache_info}"
+
+    def _mirror_to_spotify(self, yt_playlist_id, sp_playlist_id, matched, state, snapshot_id, yt_fingerprint,
+                           progress_callback=None):
+        """
+        Applies the minimal add/remove/reorder diff between the matched source order and the
+        Spotify playlist. state: the stored sync state if it still matches snapshot_id, in
+        which case its URIs are used instead of re-reading the playlist.
+        """
+        desired = list(dict.fromkeys(matched)) # One copy of each track, first position wins
+        current = state['uris'] if state else self.sp.get_playlist_uris(sp_playlist_id)
+
+        if current == desired:
+            self.db.save_sync_state(yt_playlist_id, sp_playlist_id, snapshot_id, desired, yt_fingerprint)
+            return "Already in sync."
+
+        if progress_callback: progress_callback(len(matched), len(matched), "Mirroring changes...")
+        stats = self.sp.mirror_playlist(sp_playlist_id, desired, current)
+        self.db.save_sync_state(yt_playlist_id, sp_playlist_id, stats['snapshot_id'] or snapshot_id, desired, yt_fingerprint)
+        if stats['replaced']:
+            return f"Mirrored by rewriting the playlist ({len(desired)} tracks)."
+        return f"Mirrored: {stats['added']} added, {stats['removed']} removed, {stats['moved']} moved."
 
     def sync_to_youtube(self, sp_playlist_id, yt_playlist_name=None, smart=True, progress_callback=None):
         self.connect()
@@ -117,23 +305,55 @@ class SyncEngine:
         
         video_ids = []
         total = len(sp_tracks)
+        cached = self.db.get_track_matches('spotify', [t['uri'] for t in sp_tracks], self.miss_ttl)
+        # ISRCs learned by either direction resolve tracks already in the library without a search
+        local = self.db.get_videos_by_isrc(t['isrc'] for t in sp_tracks if t['uri'] not in cached and t.get('isrc'))
+        pending = [t for t in sp_tracks if t['uri'] not in cached and t.get('isrc') not in local]
+        searched = iter(self._match_parallel(
+            pending, self._search_on_youtube, lambda t: t['title'],
+            progress_callback, done=total - len(pending), total=total, verb="Searching"
+        ))
+        new_matches = []
+        learned_isrcs = []
+        hits = misses = 0
         
-        for i, track in enumerate(sp_tracks):
+        for track in sp_tracks:
             query = f"{track['artist']} {track['title']}"
-            if progress_callback and i % 5 == 0:
-                progress_callback(i+1, total, f"Searching: {track['title']}")
                 
-            results = self.yt.yt.search(query, filter="songs", limit=1)
-            if results:
-                video_ids.append(results[0]['videoId'])
+            if track['uri'] in cached:
+                hits += 1
+                video_id = cached[track['uri']]
+            elif track.get('isrc') in local:
+                video_id = local[track['isrc']]
+                new_matches.append((track['uri'], video_id, 'isrc'))
+            else:
+                misses += 1
+                result = next(searched)
+                if result is MATCH_ERROR:
+                    continue
+                video_id, method, isrc = result
+                if method != 'guess': # A guess is retried next run instead of sticking
+                    new_matches.append((track['uri'], video_id, method))
+                if video_id and isrc:
+                    learned_isrcs.append((video_id, isrc)) # Lets the reverse sync use isrc: too
+            if video_id:
+                video_ids.append(video_id)
             else:
                 print(f"Missing on YT: {query}")
                 
+        if new_matches:
+            self.db.save_track_matches('spotify', new_matches)
+        if learned_isrcs:
+            self.db.set_track_isrcs(learned_isrcs)
+        by_isrc = sum(1 for m in new_matches if m[2] == 'isrc')
+        cache_info = f"(match cache: {hits} hits, {misses} misses, {by_isrc} by ISRC)"
+                
         # Add
         if video_ids:
             if progress_callback: progress_callback(total, total, f"Importing {len(video_ids)} tracks...")
-            self.yt.add_tracks(yt_playlist_id, video_ids)
-            return f"Imported {len(video_ids)} tracks."
+            report = self.yt.add_items_internal_robust(yt_playlist_id, video_ids)
+            for skipped in report['skipped']:
+                print(f"Could not add {skipped['videoId']}: {skipped['error']}")
+            return f"Imported {report['added']} tracks ({len(report['skipped'])} rejected). {cache_info}"
         else:
-            return "No tracks found to import."
-
+            return f"No tracks found to import. {cache_info}"